@@ -0,0 +1,54 @@
+"""Await python-telegram ``AsyncResult`` objects from an asyncio event loop.
+
+python-telegram completes a result on its listener thread by setting the
+result's ``_ready`` :class:`threading.Event`; ``AsyncResult.wait()`` blocks on
+that event, which costs a thread per outstanding request.  :func:`wait`
+instead swaps in an event that also resolves an asyncio future, so a single
+event-loop thread can keep any number of requests in flight.
+"""
+
+import asyncio
+import threading
+
+
+class _LoopEvent(threading.Event):
+    """A threading.Event that also completes *future* on *loop* when set."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        super().__init__()
+        self._loop, self._future = loop, future
+
+    def set(self):
+        super().set()
+        try:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+        except RuntimeError:
+            pass  # loop already closed — nobody is waiting any more
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def wait(result, raise_exc: bool = False):
+    """Await *result* like ``result.wait(raise_exc=raise_exc)`` without blocking the loop.
+
+    Returns *result*.  With *raise_exc*, a TDLib error raises
+    ``RuntimeError('Telegram error: …')`` just like ``call_method(block=True)``.
+    """
+    ready = getattr(result, "_ready", None)
+    if ready is None:
+        # Not a python-telegram result we can hook into — wait on a worker thread.
+        await asyncio.get_running_loop().run_in_executor(None, result.wait)
+    elif not ready.is_set():
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        result._ready = _LoopEvent(loop, future)
+        # The listener may have set the old event just before the swap.
+        if ready.is_set():
+            result._ready.set()
+        await future
+    if raise_exc and result.error:
+        raise RuntimeError(f"Telegram error: {result.error_info}")
+    return result
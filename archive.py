@@ -0,0 +1,182 @@
+"""Local chat archives: history streamed to gzipped JSONL chunks with a sidecar index.
+
+Each chat gets a directory of chunk files holding up to ``CHUNK_MESSAGES``
+messages each, oldest first, one TDLib ``message`` object per line, plus an
+``index.json`` recording every chunk's message count and ID and date range::
+
+    {"chunks": [{"file": "000001.jsonl.gz", "count": 5000,
+      "first_id": 1048576, "last_id": 5242880000,
+      "first_date": 1600000000, "last_date": 1610000000}, …]}
+
+Exports append after the newest archived message, so re-running one only
+fetches what is new.  Reading a date or ID range opens only the chunks whose
+range overlaps it::
+
+    python -m archive data/archive/-1002 --from 2024-01-01 --to 2024-01-31 > jan.jsonl
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from atomicfile import write_json_atomic
+
+ARCHIVE_DIR = "data/archive"
+CHUNK_MESSAGES = 5000  # messages per chunk file
+
+
+class ChatArchive:
+    """The archive of one chat in *directory*."""
+
+    def __init__(self, directory: str, chunk_messages: int = CHUNK_MESSAGES):
+        self.directory = directory
+        self.chunk_messages = chunk_messages
+        self.index_path = os.path.join(directory, "index.json")
+        try:
+            with open(self.index_path) as f:
+                self.chunks: list = json.load(f)["chunks"]
+        except FileNotFoundError:
+            self.chunks = []
+
+    @classmethod
+    def for_chat(cls, chat_id: int, root: str = ARCHIVE_DIR) -> "ChatArchive":
+        return cls(os.path.join(root, str(chat_id)))
+
+    @property
+    def last_id(self) -> int:
+        """ID of the newest archived message (0 if the archive is empty)."""
+        return self.chunks[-1]["last_id"] if self.chunks else 0
+
+    def __len__(self) -> int:
+        return sum(c["count"] for c in self.chunks)
+
+    def _save_index(self):
+        write_json_atomic(self.index_path, {"chunks": self.chunks})
+
+    def writer(self) -> "ArchiveWriter":
+        os.makedirs(self.directory, exist_ok=True)
+        return ArchiveWriter(self)
+
+    def read(self, from_ts: int = None, to_ts: int = None, from_id: int = None, to_id: int = None):
+        """Yield the archived messages within the given date and ID bounds, oldest first."""
+        for chunk in self.chunks:
+            if (from_ts is not None and chunk["last_date"] < from_ts
+                    or to_ts is not None and chunk["first_date"] > to_ts
+                    or from_id is not None and chunk["last_id"] < from_id
+                    or to_id is not None and chunk["first_id"] > to_id):
+                continue
+            for m in _lines(os.path.join(self.directory, chunk["file"]), chunk["count"]):
+                if ((from_ts is None or m["date"] >= from_ts)
+                        and (to_ts is None or m["date"] <= to_ts)
+                        and (from_id is None or m["id"] >= from_id)
+                        and (to_id is None or m["id"] <= to_id)):
+                    yield m
+
+
+def _lines(path: str, count: int):
+    # Only the first `count` lines are indexed; anything after them was
+    # written by an export that crashed before it could update the index.
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for _, line in zip(range(count), f):
+            yield json.loads(line)
+
+
+class ArchiveWriter:
+    """Appends messages, oldest first and newer than ``archive.last_id``, to an archive.
+
+    A chunk is written to a temporary file and renamed into place when it
+    is full or the writer is closed; the index is updated after the rename.
+    A partly full last chunk is refilled rather than left behind, by copying
+    its messages into the new file first, so only one chunk is held open
+    and memory use does not grow with the chat.
+    """
+
+    def __init__(self, archive: ChatArchive):
+        self.archive = archive
+        self._file = None
+        self._entry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _path(self, entry: dict) -> str:
+        return os.path.join(self.archive.directory, entry["file"])
+
+    def _open(self):
+        chunks = self.archive.chunks
+        if chunks and chunks[-1]["count"] < self.archive.chunk_messages:
+            self._entry = dict(chunks[-1])
+            self._file = gzip.open(self._path(self._entry) + ".tmp", "wt", encoding="utf-8")
+            with gzip.open(self._path(self._entry), "rt", encoding="utf-8") as old:
+                for _, line in zip(range(self._entry["count"]), old):
+                    self._file.write(line)
+        else:
+            self._entry = {"file": f"{len(chunks) + 1:06d}.jsonl.gz", "count": 0}
+            self._file = gzip.open(self._path(self._entry) + ".tmp", "wt", encoding="utf-8")
+
+    def write(self, message: dict):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n")
+        entry = self._entry
+        if not entry["count"]:
+            entry["first_id"], entry["first_date"] = message["id"], message.get("date", 0)
+        entry["last_id"], entry["last_date"] = message["id"], message.get("date", 0)
+        entry["count"] += 1
+        if entry["count"] >= self.archive.chunk_messages:
+            self._finish()
+
+    def _finish(self):
+        self._file.close()
+        self._file = None
+        path = self._path(self._entry)
+        os.replace(path + ".tmp", path)
+        chunks = self.archive.chunks
+        if chunks and chunks[-1]["file"] == self._entry["file"]:
+            chunks[-1] = self._entry
+        else:
+            chunks.append(self._entry)
+        self.archive._save_index()
+
+    def close(self):
+        if self._file is not None:
+            self._finish()
+
+
+def parse_date(value: str, end_of_day: bool = False):
+    """Parse 'YYYY-MM-DD' as midnight UTC (or 23:59:59 when *end_of_day* is True).
+
+    Returns None for an empty string; raises ValueError if malformed.
+    """
+    if not value:
+        return None
+    ts = int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    return ts + 86399 if end_of_day else ts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print archived messages as JSONL.")
+    parser.add_argument("directory", help="archive directory, e.g. data/archive/-1002")
+    parser.add_argument("--from", dest="from_date", help="first day, YYYY-MM-DD (UTC)")
+    parser.add_argument("--to", dest="to_date", help="last day, YYYY-MM-DD (UTC)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(os.path.join(args.directory, "index.json")):
+        parser.error(f"no archive in {args.directory}")
+    try:
+        from_ts = parse_date(args.from_date)
+        to_ts = parse_date(args.to_date, end_of_day=True)
+    except ValueError:
+        parser.error("dates must be YYYY-MM-DD")
+    for m in ChatArchive(args.directory).read(from_ts, to_ts):
+        sys.stdout.write(json.dumps(m, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
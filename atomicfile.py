@@ -0,0 +1,40 @@
+"""Crash-safe file replacement shared by every TeleCopy state file.
+
+A file is written to ``<path>.tmp``, flushed and fsynced, then renamed over
+*path* and the directory entry fsynced, so a crash or power loss leaves
+either the old content or the new content — never a truncated file.
+"""
+
+import json
+import os
+
+
+def fsync_dir(path: str):
+    """fsync the directory containing *path* so a rename into it is durable."""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: str, chunks, binary: bool = False):
+    """Atomically replace *path* with the concatenated *chunks* (str, or bytes if *binary*)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with (open(tmp, "wb") if binary else open(tmp, "w", encoding="utf-8")) as f:
+        f.writelines(chunks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(path)
+
+
+def write_json_atomic(path: str, obj, **kwargs):
+    """Atomically replace *path* with *obj* as JSON (*kwargs* go to :func:`json.dumps`)."""
+    write_atomic(path, (json.dumps(obj, **kwargs),))
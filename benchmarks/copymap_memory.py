@@ -0,0 +1,63 @@
+"""Memory benchmark: ``dict`` vs ``CompactCopyMap`` for the copy map.
+
+Run from the repository root::
+
+    python -m benchmarks.copymap_memory            # 1M and 10M entries
+    python -m benchmarks.copymap_memory 250000     # custom sizes
+
+Each size is measured with ``tracemalloc`` in a fresh structure, using
+Telegram-like keys (server message IDs shifted left by 20 bits, ascending)
+and destination IDs in a distant range so no small-int caching applies.
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from copymap import CompactCopyMap
+
+DEFAULT_SIZES = (1_000_000, 10_000_000)
+
+
+def _pairs(n: int):
+    base = 5_000_000 << 20
+    return (((i + 1) << 20, base + ((i + 1) << 20)) for i in range(n))
+
+
+def _measure(factory, n: int):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    m = factory()
+    for k, v in _pairs(n):
+        m[k] = v
+    build = time.perf_counter() - t0
+    if hasattr(m, "sorted_arrays"):
+        m.sorted_arrays()  # settle pending writes, as a flush would
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    probes = [((i * 7919) % n + 1) << 20 for i in range(100_000)]
+    t0 = time.perf_counter()
+    hits = sum(1 for k in probes if k in m)
+    lookup = (time.perf_counter() - t0) / len(probes)
+    assert hits == len(probes)
+    del m
+    gc.collect()
+    return current, peak, build, lookup
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or DEFAULT_SIZES
+    print(f"{'entries':>12} {'structure':>15} {'MiB':>9} {'B/entry':>8} "
+          f"{'peak MiB':>9} {'build s':>8} {'lookup µs':>10}")
+    for n in sizes:
+        for name, factory in (("dict", dict), ("CompactCopyMap", CompactCopyMap)):
+            current, peak, build, lookup = _measure(factory, n)
+            print(f"{n:>12,} {name:>15} {current / 2**20:>9.1f} {current / n:>8.1f} "
+                  f"{peak / 2**20:>9.1f} {build:>8.2f} {lookup * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,196 @@
+"""Throughput benchmark for full_copy, date_copy and live monitoring on FakeTelegram.
+
+Run from the repository root (requirements installed)::
+
+    python -m benchmarks.throughput                       # all scenarios
+    python -m benchmarks.throughput full --messages 200000 --latency 0.02
+
+Each scenario runs in its own subprocess and scratch directory, so peak RSS
+is per scenario and no real ``data/`` is touched.  Results are appended to
+``benchmarks/results.jsonl`` tagged with the current git revision, and each
+run is compared with the previous one for the same scenario and settings.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results.jsonl")
+SCENARIOS = ("full", "date", "live")
+SRC, DST = -1001, -1002
+
+# Settings that identify comparable runs.
+PARAMS = ("messages", "latency", "flood_limit", "failure_rate", "album_ratio", "rate",
+          "workers", "live_messages", "live_rate")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _day(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _run(scenario: str, args) -> dict:
+    """Run one scenario in the current process and return its metrics."""
+    os.chdir(tempfile.mkdtemp(prefix="telecopy-bench-"))
+    os.environ.update(SOURCE=str(SRC), DESTINATION=str(DST), TQDM_DISABLE="1",
+                      LIVE_WORKERS=str(args.workers))
+    sys.path.insert(0, ROOT)
+    import logging
+    import main
+    import fake_tdlib
+    logging.getLogger().setLevel(logging.WARNING)
+
+    os.makedirs("data", exist_ok=True)
+    with open(main.RATE_LIMITS_PATH, "w") as f:
+        json.dump({str(DST): args.rate}, f)
+
+    tg = fake_tdlib.FakeTelegram(latency=args.latency, flood_limit=args.flood_limit,
+                                 failure_rate=args.failure_rate, seed=1)
+    tg.add_chat(SRC, 0 if scenario == "live" else args.messages, album_ratio=args.album_ratio)
+    tg.add_chat(DST)
+    tc = main.TeleCopy()
+    tc.tg, tc.session_active = tg, True
+
+    first_copy = None
+    copied_at: dict[int, float] = {}
+    record = tc._record_copy
+
+    def timed_record(src, dst, src_id, dst_id, **kwargs):
+        nonlocal first_copy
+        now = time.perf_counter()
+        first_copy = first_copy or now
+        copied_at[src_id] = now
+        record(src, dst, src_id, dst_id, **kwargs)
+
+    tc._record_copy = timed_record
+    result: dict = {}
+    t0 = time.perf_counter()
+    if scenario == "full":
+        tc.full_copy(verify=True)
+    elif scenario == "date":
+        # The oldest tenth of a long history: the case jump-to-date seeking targets.
+        history_days = args.messages * 60 // 86400
+        start = fake_tdlib.EPOCH + 86400
+        tc.date_copy(_day(start), _day(start + max(1, history_days // 10) * 86400))
+    else:
+        posted_at: dict[int, float] = {}
+        monitor = threading.Thread(target=tc.start_live_monitoring, daemon=True)
+        monitor.start()
+        time.sleep(0.2)
+        t0 = time.perf_counter()
+        burst = 50
+        for i in range(0, args.live_messages, burst):
+            count = min(burst, args.live_messages - i)
+            for m in tg.post(SRC, count, album=(i // burst) % 5 == 0):
+                posted_at[m["id"]] = time.perf_counter()
+            time.sleep(burst / args.live_rate)
+        deadline = time.perf_counter() + 60
+        while len(copied_at) < len(posted_at) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        tc.monitoring = False
+        monitor.join()
+        lat = sorted(copied_at[m] - posted_at[m] for m in copied_at if m in posted_at)
+        if lat:
+            result["latency_p50_s"] = round(lat[len(lat) // 2], 4)
+            result["latency_p95_s"] = round(lat[int(len(lat) * 0.95)], 4)
+    elapsed = (time.perf_counter() - t0) if scenario != "live" else (
+        max(copied_at.values(), default=t0) - t0)
+    copied = len(copied_at)
+    calls = sum(tg.calls.values())
+    result.update({
+        "copied": copied,
+        "seconds": round(elapsed, 3),
+        "msgs_per_s": round(copied / elapsed, 1) if elapsed else None,
+        "api_calls_per_msg": round(calls / copied, 4) if copied else None,
+        "forward_calls": tg.calls.get("forwardMessages", 0),
+        "history_calls": tg.calls.get("getChatHistory", 0),
+        "flood_waits": tg.floods,
+        "time_to_first_copy_s": round(first_copy - t0, 4) if first_copy else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+    return result
+
+
+def _previous(results: list, entry: dict):
+    for old in reversed(results):
+        if old["scenario"] == entry["scenario"] and old["params"] == entry["params"]:
+            return old
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per TDLib call")
+    parser.add_argument("--flood-limit", type=int, default=30,
+                        help="forward calls per second before FloodWait (0 = never)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--album-ratio", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="pre-learned send rate (req/s) seeded for the destination")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--live-messages", type=int, default=5_000)
+    parser.add_argument("--live-rate", type=float, default=500.0, help="posts per second in live mode")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # internal: run one scenario
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if args.run:
+        print(json.dumps(_run(args.run, args)))
+        return
+
+    params = {p: getattr(args, p) for p in PARAMS}
+    try:
+        with open(RESULTS_PATH) as f:
+            results = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        results = []
+    version = _git_rev()
+    passthrough = [a for a in (argv if argv is not None else sys.argv[1:]) if a not in SCENARIOS]
+    for scenario in args.scenarios or SCENARIOS:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.throughput", *passthrough, "--run", scenario],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode:
+            print(f"{scenario}: failed\n{proc.stderr}", file=sys.stderr)
+            continue
+        metrics = json.loads(proc.stdout.strip().splitlines()[-1])
+        entry = {"version": version, "ts": int(time.time()), "scenario": scenario,
+                 "params": params, "metrics": metrics}
+        prev = _previous(results, entry)
+        print(f"\n== {scenario} ({version}) ==")
+        for key, value in metrics.items():
+            line = f"  {key:>22}: {value}"
+            if prev and isinstance(value, (int, float)) and prev["metrics"].get(key):
+                old = prev["metrics"][key]
+                line += f"   (was {old} @ {prev['version']}, {100 * (value - old) / old:+.1f}%)"
+            print(line)
+        results.append(entry)
+        with open(RESULTS_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
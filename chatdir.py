@@ -0,0 +1,189 @@
+"""On-disk directory of the account's chats, loaded concurrently and kept fresh by updates."""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+
+import aio
+from atomicfile import write_json_atomic
+
+log = logging.getLogger("telecopy")
+
+CHAT_FETCH_WINDOW = 16  # max getChat requests in flight while loading the directory
+CHATS_PAGE = 200        # chat IDs per getChats request
+
+# Updates that keep the directory current while connected.
+UPDATES = ("updateNewChat", "updateChatTitle", "updateChatPosition")
+
+
+def chat_kind(chat: dict) -> str:
+    """Return a short label for the chat's type: private, group, channel, …"""
+    kind = chat.get("type", {})
+    return {
+        "chatTypePrivate": "private",
+        "chatTypeBasicGroup": "group",
+        "chatTypeSecret": "secret",
+    }.get(kind.get("@type")) or ("channel" if kind.get("is_channel") else "supergroup")
+
+
+def _order(chat: dict) -> int:
+    # Older TDLib reports a chat-level "order"; newer ones a list of positions.
+    order = chat.get("order")
+    if order is None:
+        positions = chat.get("positions") or [{}]
+        order = positions[0].get("order", 0)
+    return int(order)
+
+
+class ChatDirectory:
+    """``{chat ID: {id, title, type, order}}`` for every chat of the account.
+
+    Persisted as JSON at *path* so the chat picker opens instantly; a
+    :meth:`refresh` reloads it from TDLib with up to CHAT_FETCH_WINDOW getChat
+    requests in flight, and :meth:`handle_update` applies the UPDATES that
+    arrive while connected.  Thread-safe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._chats: dict = None  # loaded on first use
+        self._dirty = False
+
+    def _entries(self) -> dict:
+        if self._chats is None:
+            try:
+                with open(self.path) as f:
+                    self._chats = {c["id"]: c for c in json.load(f)}
+            except FileNotFoundError:
+                self._chats = {}
+            except (json.JSONDecodeError, KeyError, TypeError):
+                log.warning("Chat directory %s is corrupt — it will be rebuilt.", self.path)
+                self._chats = {}
+        return self._chats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries())
+
+    def get(self, chat_id: int):
+        with self._lock:
+            return self._entries().get(chat_id)
+
+    def add(self, chat: dict):
+        """Store a TDLib ``chat`` object."""
+        entry = {"id": chat["id"], "title": chat.get("title", ""),
+                 "type": chat_kind(chat), "order": _order(chat)}
+        with self._lock:
+            chats = self._entries()
+            if chats.get(entry["id"]) != entry:
+                chats[entry["id"]] = entry
+                self._dirty = True
+
+    def handle_update(self, update: dict):
+        """Apply an updateNewChat, updateChatTitle or updateChatPosition."""
+        kind = update.get("@type")
+        if kind == "updateNewChat":
+            self.add(update["chat"])
+            return
+        with self._lock:
+            entry = self._entries().get(update.get("chat_id"))
+            if entry is None:
+                return
+            if kind == "updateChatTitle":
+                entry["title"] = update["title"]
+            elif kind == "updateChatPosition":
+                position = update.get("position", {})
+                if position.get("list", {}).get("@type", "chatListMain") != "chatListMain":
+                    return
+                entry["order"] = int(position.get("order", 0))
+            else:
+                return
+            self._dirty = True
+
+    def search(self, text: str = "") -> list:
+        """Return the chats whose title or ID contains *text* (case-insensitive), in chat-list order."""
+        text = text.strip().lower()
+        with self._lock:
+            chats = list(self._entries().values())
+        if text:
+            chats = [c for c in chats if text in c["title"].lower() or text in str(c["id"])]
+        return sorted(chats, key=lambda c: (-c["order"], c["title"].lower()))
+
+    def save(self):
+        """Write the directory to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = list(self._entries().values())
+            self._dirty = False
+        write_json_atomic(self.path, data, ensure_ascii=False)
+
+    def clear(self):
+        with self._lock:
+            self._chats = {}
+            self._dirty = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def refresh(self, tg, window: int = CHAT_FETCH_WINDOW) -> int:
+        """Reload every chat from TDLib and return how many there are.
+
+        getChats pages are requested one after another (each needs the sort
+        order of the previous page's last chat as its cursor), while the
+        details of each page's chats are fetched concurrently, at most
+        *window* at a time.  Chats no longer in the list are dropped.
+        """
+        slots = asyncio.Semaphore(window)
+
+        async def fetch(chat_id):
+            async with slots:
+                result = await aio.wait(tg.get_chat(chat_id))
+            if result.update:
+                self.add(result.update)
+            return result.update
+
+        seen: set = set()
+        details = []
+        # TDLib requires the initial offset_order to be Int64.MAX so that the
+        # first page returns the chats with the highest sort order.
+        offset_order, offset_chat_id = sys.maxsize, 0
+        complete = False
+        while True:
+            result = await aio.wait(tg.get_chats(
+                limit=CHATS_PAGE, offset_order=offset_order, offset_chat_id=offset_chat_id,
+            ))
+            if not result.update:
+                log.error("Failed to retrieve chat list.")
+                break
+            chat_ids = result.update.get("chat_ids", [])
+            new_ids = [cid for cid in chat_ids if cid not in seen]
+            if not new_ids:
+                complete = True
+                break
+            seen.update(new_ids)
+            details += [asyncio.ensure_future(fetch(cid)) for cid in new_ids if cid != chat_ids[-1]]
+            # (order, chat_id) of the page's last chat is the cursor for the next page.
+            cursor = await fetch(chat_ids[-1])
+            if not cursor:
+                break
+            offset_order, offset_chat_id = _order(cursor), chat_ids[-1]
+            if len(chat_ids) < CHATS_PAGE:
+                complete = True
+                break
+        await asyncio.gather(*details)
+
+        with self._lock:
+            chats = self._entries()
+            if complete:
+                for cid in set(chats) - seen:
+                    del chats[cid]
+                    self._dirty = True
+            count = len(chats)
+        self.save()
+        return count
@@ -0,0 +1,458 @@
+"""Crash-safe, append-only persistence for TeleCopy's source → destination copy map."""
+
+import contextlib
+import os
+import sys
+import logging
+from array import array
+from bisect import bisect_left
+
+from atomicfile import write_atomic
+
+log = logging.getLogger("telecopy")
+
+SNAPSHOT_MAGIC = b"TCSNAP1\n"
+COMPACT_MIN_RECORDS = 10_000  # never compact a journal shorter than this
+MERGE_MIN = 65_536            # recent-writes dict size that triggers a merge
+
+
+def _to_le(a: array) -> array:
+    """Return *a* in little-endian byte order (the on-disk format)."""
+    if sys.byteorder == "big":
+        a = array("q", a)
+        a.byteswap()
+    return a
+
+
+def _fsync_handle(fd):
+    """fsync and close a descriptor from :meth:`CopyJournal.sync_handle` (None is ignored)."""
+    if fd is None:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CompactCopyMap:
+    """Memory-compact ``{source ID: destination ID}`` map of int64s.
+
+    Entries live in two parallel sorted ``array('q')`` columns (16 bytes per
+    entry, against ~100 for a ``dict`` of boxed ints) and are looked up by
+    binary search.  New keys go into a small ``dict`` of recent writes that is
+    merged into the arrays once it grows past ``MERGE_MIN`` or 1/16 of the map.
+    Because Telegram message IDs only grow, a merge is nearly always a plain
+    append; out-of-order keys are spliced in with slice copies.
+
+    Supports the subset of the ``dict`` API TeleCopy uses: ``in``, ``[]``,
+    ``get``, ``len``, iteration, ``keys``, ``items``, ``update`` and ``clear``,
+    plus :meth:`discard`.
+    """
+
+    __slots__ = ("_keys", "_values", "_recent")
+
+    def __init__(self, items=None):
+        self._keys = array("q")
+        self._values = array("q")
+        self._recent: dict[int, int] = {}
+        if items:
+            self.update(items)
+
+    @classmethod
+    def from_sorted(cls, keys: array, values: array) -> "CompactCopyMap":
+        """Adopt already-sorted, duplicate-free *keys*/*values* arrays without copying."""
+        m = cls()
+        m._keys, m._values = keys, values
+        return m
+
+    def _find(self, key: int) -> int:
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        return -1
+
+    def __contains__(self, key) -> bool:
+        return key in self._recent or self._find(key) >= 0
+
+    def __getitem__(self, key: int) -> int:
+        try:
+            return self._recent[key]
+        except KeyError:
+            pass
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def get(self, key: int, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: int, value: int):
+        keys = self._keys
+        if keys and key <= keys[-1]:
+            i = self._find(key)
+            if i >= 0:
+                self._values[i] = value
+                return
+        self._recent[key] = value
+        if len(self._recent) >= max(MERGE_MIN, len(self._keys) // 16):
+            self._merge()
+
+    def update(self, items):
+        if hasattr(items, "items"):
+            items = items.items()
+        for k, v in items:
+            self[k] = v
+
+    def discard(self, key: int):
+        """Remove *key* if present.  Rare, so the arrays are simply rebuilt without it."""
+        if self._recent.pop(key, None) is not None:
+            return
+        i = self._find(key)
+        if i >= 0:
+            # New arrays, as in _merge, so a concurrent lookup never sees them half-shifted.
+            self._keys, self._values = (self._keys[:i] + self._keys[i + 1:],
+                                        self._values[:i] + self._values[i + 1:])
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._recent)
+
+    def __iter__(self):
+        yield from self._keys
+        yield from list(self._recent)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        yield from zip(self._keys, self._values)
+        yield from list(self._recent.items())
+
+    def clear(self):
+        self._keys = array("q")
+        self._values = array("q")
+        self._recent.clear()
+
+    def _merge(self):
+        if not self._recent:
+            return
+        # Recent writes are dropped only after they are in the arrays, so a
+        # concurrent lookup never sees a key vanish mid-merge.
+        new = sorted(self._recent.items())
+        keys, values = self._keys, self._values
+        if not keys or new[0][0] > keys[-1]:
+            keys.extend(k for k, _ in new)
+            values.extend(v for _, v in new)
+            self._recent.clear()
+            return
+        merged_keys, merged_values = array("q"), array("q")
+        prev = 0
+        for k, v in new:
+            i = bisect_left(keys, k, prev)
+            merged_keys.extend(keys[prev:i])
+            merged_values.extend(values[prev:i])
+            merged_keys.append(k)
+            merged_values.append(v)
+            prev = i
+        merged_keys.extend(keys[prev:])
+        merged_values.extend(values[prev:])
+        self._keys, self._values = merged_keys, merged_values
+        self._recent.clear()
+
+    def sorted_arrays(self):
+        """Return the ``(keys, values)`` arrays with all recent writes merged in."""
+        self._merge()
+        return self._keys, self._values
+
+
+class CopyJournal:
+    """Snapshot + append-only journal of ``(source ID, destination ID)`` pairs.
+
+    New pairs are appended to ``<prefix>.journal`` as fixed 16-byte records,
+    so recording a copy is O(1) regardless of the map size.  Once the journal
+    outgrows the live map it is folded into ``<prefix>.snap`` — a sorted array
+    of pairs written to a temporary file and atomically renamed into place —
+    and the records it covers are cut from the journal.  A crash can at worst leave a torn final journal record,
+    which is discarded on load; replaying records already in the snapshot is
+    harmless because later records win.  A record with destination ID 0
+    removes its source ID.
+    """
+
+    RECORD = 16  # two little-endian int64s
+
+    def __init__(self, prefix: str):
+        self.snap_path = prefix + ".snap"
+        self.journal_path = prefix + ".journal"
+        self._fh = None
+        self._records = 0  # records currently in the journal file
+
+    # ── Loading ─────────────────────────────────────────────────────────────
+
+    def _read_snapshot(self):
+        """Return ``(keys, values)`` arrays from the snapshot (empty if absent)."""
+        keys, values = array("q"), array("q")
+        try:
+            with open(self.snap_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return keys, values
+        if not data.startswith(SNAPSHOT_MAGIC):
+            log.error("Copy-map snapshot %s is not recognised — ignoring it.", self.snap_path)
+            return keys, values
+        body = data[len(SNAPSHOT_MAGIC):]
+        half = len(body) // 2
+        if len(body) % (2 * keys.itemsize):
+            log.error("Copy-map snapshot %s is truncated — ignoring it.", self.snap_path)
+            return keys, values
+        keys.frombytes(body[:half])
+        values.frombytes(body[half:])
+        if sys.byteorder == "big":
+            keys.byteswap()
+            values.byteswap()
+        return keys, values
+
+    def _read_journal(self) -> array:
+        """Return the journal as a flat ``[src, dst, src, dst, …]`` array."""
+        pairs = array("q")
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._records = 0
+            return pairs
+        usable = len(data) - len(data) % self.RECORD
+        if usable != len(data):
+            log.warning(
+                "Discarding torn trailing record in %s (%d bytes).",
+                self.journal_path, len(data) - usable,
+            )
+            # Cut the torn bytes off so later appends stay record-aligned.
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(usable)
+        pairs.frombytes(data[:usable])
+        if sys.byteorder == "big":
+            pairs.byteswap()
+        self._records = usable // self.RECORD
+        return pairs
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snap_path) or os.path.exists(self.journal_path)
+
+    def load(self) -> CompactCopyMap:
+        """Return the persisted map; the sorted snapshot is adopted as-is."""
+        mapping = CompactCopyMap.from_sorted(*self._read_snapshot())
+        pairs = self._read_journal()
+        for src_id, dst_id in zip(pairs[0::2], pairs[1::2]):
+            if dst_id:
+                mapping[src_id] = dst_id
+            else:
+                mapping.discard(src_id)
+        return mapping
+
+    # ── Writing ─────────────────────────────────────────────────────────────
+
+    def append(self, src_id: int, dst_id: int):
+        """Buffer one ``src → dst`` record; call :meth:`flush` to make it durable."""
+        if self._fh is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._fh = open(self.journal_path, "ab")
+        self._fh.write(_to_le(array("q", (src_id, dst_id))).tobytes())
+        self._records += 1
+
+    def flush(self):
+        """Write buffered records through to disk."""
+        _fsync_handle(self.sync_handle())
+
+    def sync_handle(self):
+        """Hand buffered records to the OS; return a descriptor to fsync them with (or None).
+
+        The descriptor is a duplicate that the caller must close, so it
+        stays valid even if the journal is closed or compacted meanwhile.
+        """
+        if self._fh is None:
+            return None
+        self._fh.flush()
+        return os.dup(self._fh.fileno())
+
+    def needs_compaction(self, live_entries: int) -> bool:
+        # Compacting only once the journal is at least as long as the live map
+        # keeps the amortised cost of each record O(1).
+        return self._records >= max(COMPACT_MIN_RECORDS, live_entries)
+
+    def compact(self, mapping: CompactCopyMap):
+        """Replace snapshot + journal with a fresh snapshot of *mapping*."""
+        covered, keys, values = self.capture(mapping)
+        self.write_snapshot(keys, values)
+        self.drop_prefix(covered)
+
+    def capture(self, mapping: CompactCopyMap) -> tuple:
+        """Return ``(journal records, keys bytes, values bytes)`` of *mapping* as it is now.
+
+        The first step of a compaction, taken while *mapping* cannot change;
+        :meth:`write_snapshot` and :meth:`drop_prefix` finish it.
+        """
+        if self._fh is not None:
+            self._fh.flush()
+        keys, values = mapping.sorted_arrays()
+        return self._records, _to_le(keys).tobytes(), _to_le(values).tobytes()
+
+    def write_snapshot(self, keys: bytes, values: bytes):
+        """Atomically replace the snapshot (safe while records are being appended)."""
+        write_atomic(self.snap_path, (SNAPSHOT_MAGIC, keys, values), binary=True)
+
+    def drop_prefix(self, records: int):
+        """Remove the first *records* journal records, which the snapshot now holds.
+
+        Records appended since :meth:`capture` are carried over into the
+        new journal, which atomically replaces the old one.
+        """
+        self.close()
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(records * self.RECORD)
+                tail = f.read()
+        except FileNotFoundError:
+            tail = b""
+        write_atomic(self.journal_path, (tail,), binary=True)
+        self._records = len(tail) // self.RECORD
+
+    def close(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except OSError:
+                pass
+            self._fh = None
+
+    def clear(self):
+        """Close the journal and delete both files."""
+        self.close()
+        self._records = 0
+        for path in (self.snap_path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class CopyMapStore:
+    """Copy maps for many ``(source, destination)`` chat pairs, one journal each.
+
+    Message IDs are only unique within a chat, so each pair has its own
+    CompactCopyMap persisted under ``<directory>/<source>_<destination>``.
+    Maps are loaded on first use, so only the pairs a run touches cost
+    memory.  Not thread-safe: callers serialise access.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps: dict[tuple, CompactCopyMap] = {}
+        self._journals: dict[tuple, CopyJournal] = {}
+
+    def _journal(self, pair: tuple) -> CopyJournal:
+        journal = self._journals.get(pair)
+        if journal is None:
+            prefix = os.path.join(self.directory, "%d_%d" % pair)
+            journal = self._journals[pair] = CopyJournal(prefix)
+        return journal
+
+    def get(self, src: int, dst: int) -> CompactCopyMap:
+        """Return the copy map of the pair, loading it from disk on first use."""
+        pair = (src, dst)
+        mapping = self._maps.get(pair)
+        if mapping is None:
+            mapping = self._maps[pair] = self._journal(pair).load()
+        return mapping
+
+    def record(self, src: int, dst: int, src_id: int, dst_id: int):
+        """Map *src_id* to *dst_id* for the pair and buffer the journal record."""
+        self.get(src, dst)[src_id] = dst_id
+        self._journal((src, dst)).append(src_id, dst_id)
+
+    def discard(self, src: int, dst: int, src_id: int):
+        """Forget the pair's copy of *src_id* and buffer the journal record saying so."""
+        self.get(src, dst).discard(src_id)
+        self._journal((src, dst)).append(src_id, 0)
+
+    def adopt(self, src: int, dst: int, entries) -> int:
+        """Merge *entries* missing from the pair's map and snapshot it; return how many."""
+        mapping = self.get(src, dst)
+        added = 0
+        for k, v in entries.items():
+            if k not in mapping:
+                mapping[k] = v
+                added += 1
+        self._journal((src, dst)).compact(mapping)
+        return added
+
+    def flush(self):
+        """Make every buffered record durable, compacting journals that outgrew their map."""
+        self.finish_flush(self.begin_flush(), contextlib.nullcontext())
+
+    def begin_flush(self) -> list:
+        """Take the quick, in-memory part of a flush and return the rest for :meth:`finish_flush`.
+
+        A caller that serialises access with a lock holds it for this step
+        only, so the store stays usable while the flush is on disk.
+        """
+        work = []
+        for pair, journal in self._journals.items():
+            mapping = self._maps.get(pair)
+            capture = None
+            if mapping is not None and journal.needs_compaction(len(mapping)):
+                capture = journal.capture(mapping)
+            work.append((journal, journal.sync_handle(), capture))
+        return work
+
+    @staticmethod
+    def finish_flush(work: list, lock):
+        """fsync the records and write the snapshots captured by :meth:`begin_flush`.
+
+        Runs without the caller's *lock*, except to trim each compacted
+        journal.  Flushes must not overlap.
+        """
+        for journal, fd, capture in work:
+            _fsync_handle(fd)
+            if capture:
+                covered, keys, values = capture
+                journal.write_snapshot(keys, values)
+                with lock:
+                    journal.drop_prefix(covered)
+
+    def loaded_entries(self) -> int:
+        return sum(len(m) for m in self._maps.values())
+
+    def pairs(self) -> list:
+        """Return every pair with a copy map on disk or in memory."""
+        found = set(self._maps)
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext not in (".snap", ".journal"):
+                continue
+            src, _, dst = stem.partition("_")
+            try:
+                found.add((int(src), int(dst)))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def exists(self) -> bool:
+        return bool(self.pairs())
+
+    def close(self):
+        for journal in self._journals.values():
+            journal.close()
+
+    def clear(self):
+        """Forget and delete the copy maps of every pair."""
+        for pair in self.pairs():
+            self._journal(pair).clear()
+        self._maps.clear()
+        self._journals.clear()
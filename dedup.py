@@ -0,0 +1,166 @@
+"""Optional content-fingerprint deduplication of copies (``CONTENT_DEDUP``)."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+MIN_TEXT = 20        # shortest normalized text that identifies a message without a file
+EVICT_EVERY = 1000   # insertions between eviction passes
+
+# Content type → (content field, file field) of the message's main file.
+_FILES = {
+    "messageVideo": ("video", "video"),
+    "messageDocument": ("document", "document"),
+    "messageAudio": ("audio", "audio"),
+    "messageAnimation": ("animation", "animation"),
+    "messageVoiceNote": ("voice_note", "voice"),
+    "messageVideoNote": ("video_note", "video"),
+    "messageSticker": ("sticker", "sticker"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    dst  INTEGER NOT NULL,
+    fp   INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (dst, fp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_by_use ON seen (used);
+"""
+
+
+def _file_id(content: dict):
+    kind = content.get("@type")
+    if kind == "messagePhoto":
+        sizes = content.get("photo", {}).get("sizes") or [{}]
+        file = sizes[-1].get("photo")  # the largest size
+    elif kind in _FILES:
+        outer, inner = _FILES[kind]
+        file = content.get(outer, {}).get(inner)
+    else:
+        return None
+    return (file or {}).get("remote", {}).get("unique_id") or None
+
+
+def fingerprint(message: dict):
+    """Return a 63-bit fingerprint of the message's content, or None if nothing identifies it.
+
+    The fingerprint covers the main file's ``remote.unique_id`` — the same
+    for every copy of a file, in any chat — and the text or caption,
+    lowercased with whitespace collapsed.  A message without a file only
+    gets one when its text is at least MIN_TEXT characters, so short
+    replies like "ok" are never treated as duplicates.
+    """
+    if "fingerprint" in message:  # precomputed, e.g. by the message index
+        return message["fingerprint"]
+    content = message.get("content") or {}
+    file_id = _file_id(content)
+    text = content.get("text") or content.get("caption") or {}
+    text = " ".join(text.get("text", "").lower().split())
+    if file_id is None and len(text) < MIN_TEXT:
+        return None
+    digest = hashlib.blake2b(f"{file_id or ''}\x00{text}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1  # fits SQLite's signed INTEGER
+
+
+class ContentDedup:
+    """Persistent set of the content fingerprints already copied to each destination.
+
+    Stored in SQLite at *path* with the time each entry was last matched.
+    It is bounded: entries unused for *max_age* seconds and, beyond
+    *max_entries*, the least recently used ones are evicted every
+    EVICT_EVERY insertions.  Thread-safe; changes are committed on
+    :meth:`flush`.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age: float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = None
+        self._inserted = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def unseen(self, dst: int, messages: list, claimed: set) -> list:
+        """Return the *messages* whose content *dst* has not received yet.
+
+        *claimed* holds the ``(dst, fingerprint)`` pairs already on their way
+        in the caller's run; the kept messages' pairs are added to it, so a
+        repeat within the run is dropped too.  Nothing is stored here: call
+        :meth:`add` once the copies have succeeded.  Messages without a
+        fingerprint are always kept.  A duplicate's entry is marked as used
+        now, so popular content stays in the index.
+        """
+        now = int(time.time())
+        kept = []
+        with self._lock:
+            db = self._open()
+            for m in messages:
+                fp = fingerprint(m)
+                if fp is None:
+                    kept.append(m)
+                    continue
+                if (dst, fp) in claimed or db.execute(
+                        "UPDATE seen SET used = ? WHERE dst = ? AND fp = ?", (now, dst, fp)).rowcount:
+                    continue
+                claimed.add((dst, fp))
+                kept.append(m)
+        return kept
+
+    def add(self, dst: int, messages: list):
+        """Record that the content of *messages* has been copied to *dst*."""
+        now = int(time.time())
+        with self._lock:
+            db = self._open()
+            for m in messages:
+                fp = fingerprint(m)
+                if fp is not None:
+                    db.execute("INSERT OR REPLACE INTO seen VALUES (?, ?, ?)", (dst, fp, now))
+                    self._inserted += 1
+            if self._inserted >= EVICT_EVERY:
+                self._evict(now)
+
+    def _evict(self, now: int):
+        db = self._db
+        if self.max_age:
+            db.execute("DELETE FROM seen WHERE used < ?", (now - self.max_age,))
+        (count,) = db.execute("SELECT COUNT(*) FROM seen").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM seen WHERE (dst, fp) IN "
+                "(SELECT dst, fp FROM seen ORDER BY used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._inserted = 0
+
+    def flush(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+
+    def clear(self):
+        """Forget every fingerprint, e.g. when the copy history is cleared."""
+        with self._lock:
+            self._open().execute("DELETE FROM seen")
+            self._db.commit()
+            self._inserted = 0
+
+    def close(self):
+        """Commit and close the database (it is reopened on next use)."""
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
@@ -0,0 +1,403 @@
+"""In-process stand-in for the parts of ``telegram.client.Telegram`` TeleCopy uses.
+
+Lets the copy engine run — and be benchmarked — without a Telegram account::
+
+    tg = FakeTelegram(latency=0.02, flood_limit=30, failure_rate=0.001)
+    tg.add_chat(-1001, 200_000, album_ratio=0.1)
+    tg.add_chat(-1002, 0)
+    tc.tg = tg
+
+Results mimic python-telegram's ``AsyncResult``: they complete on a timer
+thread after *latency* seconds, ``wait()`` blocks until then, and calls made
+with ``block=True`` raise ``RuntimeError('Telegram error: …')`` on errors.
+"""
+
+import bisect
+import random
+import threading
+import time
+from collections import deque
+
+EPOCH = 1_600_000_000  # date of the first generated message
+
+
+def _find(history: list, message_id: int):
+    """Return the message of *history* with *message_id*, or None."""
+    # Generated IDs are (position + 1) << 20, so lookups are O(1) until
+    # messages are purged; then fall back to a binary search.
+    idx = (message_id >> 20) - 1
+    if 0 <= idx < len(history) and history[idx]["id"] == message_id:
+        return history[idx]
+    idx = bisect.bisect_left([m["id"] for m in history], message_id)
+    if idx < len(history) and history[idx]["id"] == message_id:
+        return history[idx]
+    return None
+
+
+class FakeAsyncResult:
+    """Minimal python-telegram ``AsyncResult``: ``update``, ``error``, ``error_info``, ``wait``."""
+
+    def __init__(self, tg: "FakeTelegram", method: str):
+        self.id = method
+        self.update = None
+        self.error = False
+        self.error_info = None
+        self._ready = threading.Event()
+        with tg._lock:
+            tg.calls[method] = tg.calls.get(method, 0) + 1
+
+    def _resolve(self, update=None, error=None):
+        if error is not None:
+            self.error, self.error_info = True, error
+        else:
+            self.update = update
+        self._ready.set()
+
+    def wait(self, timeout=None, raise_exc=False):
+        if not self._ready.wait(timeout):
+            raise TimeoutError()
+        if raise_exc and self.error:
+            raise RuntimeError(f"Telegram error: {self.error_info}")
+
+
+class FakeTelegram:
+    """Simulated TDLib client with configurable chats, latency, FloodWaits and failures.
+
+    *flood_limit* is the number of forwardMessages calls per destination chat
+    the fake server accepts in any *flood_window*-second window; beyond it
+    calls fail with a 429 "retry after *flood_wait*" like the real thing.
+    *failure_rate* is the chance each forwarded message comes back ``None``;
+    *batch_error_rate* the chance a whole forwardMessages call errors.
+    With *confirm_sends*, forwarded copies come back with temporary IDs and
+    their permanent IDs follow in updateMessageSendSucceeded, as with TDLib,
+    or — with chance *send_failure_rate* — updateMessageSendFailed.  With
+    *hold_sends* too, those updates wait for :meth:`release_sends`.
+    """
+
+    def __init__(self, latency: float = 0.0, flood_limit: int = 0, flood_window: float = 1.0,
+                 flood_wait: int = 1, failure_rate: float = 0.0,
+                 batch_error_rate: float = 0.0, seed: int = 0, confirm_sends: bool = False,
+                 send_failure_rate: float = 0.0, hold_sends: bool = False):
+        self.latency = latency
+        self.flood_limit = flood_limit
+        self.flood_window = flood_window
+        self.flood_wait = flood_wait
+        self.failure_rate = failure_rate
+        self.batch_error_rate = batch_error_rate
+        self.confirm_sends = confirm_sends
+        self.send_failure_rate = send_failure_rate
+        self.hold_sends = hold_sends
+        self.sending: dict[tuple, dict] = {}  # (chat, temporary ID) → held send result update
+        self.calls: dict[str, int] = {}
+        self.floods = 0
+        self.forwarded: dict[int, list] = {}  # destination chat → forwarded messages
+        self.edited: list = []                 # (chat, message ID, method) of each edit
+        self.deleted: dict[int, list] = {}     # chat → message IDs deleted via deleteMessages
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._chats: dict[int, dict] = {}       # chat ID → chat object
+        self._history: dict[int, list] = {}     # chat ID → messages, oldest first
+        self._sent: dict[int, deque] = {}       # destination → recent call times
+        self._handlers: list = []
+        self._next_id = 1 << 40  # last permanent ID handed out, a server ID << 20
+        self._updates: deque = deque()
+        self._updates_ready = threading.Condition()
+        self._dispatcher = None
+
+    # ── Test set-up ─────────────────────────────────────────────────────────
+
+    def add_chat(self, chat_id: int, messages: int = 0, title: str = None,
+                 album_ratio: float = 0.0, interval: int = 60):
+        """Create a chat holding *messages* generated messages, *interval* seconds apart."""
+        self._chats[chat_id] = {
+            "@type": "chat", "id": chat_id, "title": title or f"Chat {chat_id}",
+            "type": {"@type": "chatTypeSupergroup", "is_channel": True},
+            "positions": [{"@type": "chatPosition", "order": str(len(self._chats) + 1)}],
+        }
+        history = self._history.setdefault(chat_id, [])
+        album, left = 0, 0
+        for _ in range(messages):
+            if not left and self._rng.random() < album_ratio:
+                album, left = self._rng.randrange(1, 1 << 62), self._rng.randint(2, 10)
+            history.append(self._make_message(chat_id, EPOCH + len(history) * interval,
+                                              album if left else 0))
+            left = max(0, left - 1)
+        return self._chats[chat_id]
+
+    def _make_message(self, chat_id: int, date: int, album: int = 0) -> dict:
+        history = self._history.get(chat_id)
+        server_id = (history[-1]["id"] >> 20) + 1 if history else 1
+        return {
+            "@type": "message", "id": server_id << 20, "chat_id": chat_id, "date": date,
+            "media_album_id": str(album),
+            "content": {"@type": "messagePhoto" if album else "messageText"},
+        }
+
+    def post(self, chat_id: int, count: int = 1, album: bool = False) -> list:
+        """Append *count* new messages to *chat_id* and deliver them as updateNewMessage."""
+        album_id = self._rng.randrange(1, 1 << 62) if album else 0
+        posted = []
+        with self._lock:
+            history = self._history.setdefault(chat_id, [])
+            for _ in range(count):
+                m = self._make_message(chat_id, int(time.time()), album_id)
+                history.append(m)
+                posted.append(m)
+        for m in posted:
+            self.emit({"@type": "updateNewMessage", "message": m})
+        return posted
+
+    def edit(self, chat_id: int, message_id: int, text: str):
+        """Change a message's text (or caption) and deliver updateMessageContent."""
+        with self._lock:
+            m = _find(self._history[chat_id], message_id)
+            content = dict(m["content"])
+            content["caption" if content["@type"] != "messageText" else "text"] = {
+                "@type": "formattedText", "text": text, "entities": []}
+            m["content"] = content
+        self.emit({"@type": "updateMessageContent", "chat_id": chat_id,
+                   "message_id": message_id, "new_content": content})
+
+    def delete(self, chat_id: int, message_ids: list):
+        """Deliver updateDeleteMessages for *message_ids* (the history itself is kept)."""
+        self.emit({"@type": "updateDeleteMessages", "chat_id": chat_id,
+                   "message_ids": list(message_ids), "is_permanent": True, "from_cache": False})
+
+    def purge(self, chat_id: int, message_ids):
+        """Remove *message_ids* from the history without any update, as if deleted while offline."""
+        gone = set(message_ids)
+        with self._lock:
+            self._history[chat_id] = [m for m in self._history.get(chat_id, []) if m["id"] not in gone]
+
+    def release_sends(self):
+        """Deliver the send results held back by *hold_sends*."""
+        with self._lock:
+            held, self.sending = self.sending, {}
+        for update in held.values():
+            self.emit(update)
+
+    def emit(self, update: dict):
+        """Deliver *update* to matching handlers on a single dispatch thread, like python-telegram."""
+        with self._updates_ready:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch, name="fake-tdlib-updates", daemon=True)
+                self._dispatcher.start()
+            self._updates.append(update)
+            self._updates_ready.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._updates_ready:
+                while not self._updates:
+                    self._updates_ready.wait()
+                update = self._updates.popleft()
+            for handler_type, func in list(self._handlers):
+                if handler_type == update.get("@type"):
+                    try:
+                        func(update)
+                    except Exception:
+                        pass
+
+    # ── Client surface ──────────────────────────────────────────────────────
+
+    def login(self, blocking: bool = True):
+        return None
+
+    def stop(self):
+        return None
+
+    def add_update_handler(self, handler_type: str, func):
+        self._handlers.append((handler_type, func))
+
+    def remove_update_handler(self, handler_type: str, func):
+        try:
+            self._handlers.remove((handler_type, func))
+        except ValueError:
+            pass
+
+    def _complete(self, result: FakeAsyncResult, update=None, error=None, block=False):
+        if self.latency > 0:
+            threading.Timer(self.latency, result._resolve, (update, error)).start()
+        else:
+            result._resolve(update, error)
+        if block:
+            result.wait(raise_exc=True)
+        return result
+
+    def get_chat_history(self, chat_id: int, limit: int = 1000, from_message_id: int = 0,
+                         offset: int = 0, only_local: bool = False):
+        result = FakeAsyncResult(self, "getChatHistory")
+        with self._lock:
+            history = self._history.get(chat_id, [])
+            # Index of from_message_id (or the next older message) in newest-first order.
+            if from_message_id:
+                lo, hi = 0, len(history)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if history[mid]["id"] <= from_message_id:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                start = len(history) - lo
+            else:
+                start = 0
+            start = max(0, start + offset)
+            end = len(history) - start
+            page = history[max(0, end - min(limit, 100)):end][::-1]
+        return self._complete(result, {"@type": "messages", "total_count": len(page),
+                                       "messages": page})
+
+    def get_chats(self, offset_order: int = 0, offset_chat_id: int = 0, limit: int = 100):
+        result = FakeAsyncResult(self, "getChats")
+        ids = sorted(self._chats, key=lambda c: -int(self._chats[c]["positions"][0]["order"]))
+        if offset_chat_id in self._chats:
+            ids = ids[ids.index(offset_chat_id) + 1:]
+        return self._complete(result, {"@type": "chats", "total_count": len(self._chats),
+                                       "chat_ids": ids[:limit]})
+
+    def get_chat(self, chat_id: int):
+        result = FakeAsyncResult(self, "getChat")
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return self._complete(result, error={"@type": "error", "code": 400,
+                                                 "message": "Chat not found"})
+        return self._complete(result, dict(chat, order=chat["positions"][0]["order"]))
+
+    def call_method(self, method_name: str, params: dict = None, block: bool = False):
+        result = FakeAsyncResult(self, method_name)
+        handler = getattr(self, "_m_" + method_name, None)
+        if handler is None:
+            return self._complete(result, {"@type": "ok"}, block=block)
+        update, error = handler(params or {})
+        return self._complete(result, update, error, block=block)
+
+    # ── TDLib methods ───────────────────────────────────────────────────────
+
+    def _flooded(self, chat_id: int) -> bool:
+        if not self.flood_limit:
+            return False
+        now = time.monotonic()
+        sent = self._sent.setdefault(chat_id, deque())
+        while sent and now - sent[0] > self.flood_window:
+            sent.popleft()
+        if len(sent) >= self.flood_limit:
+            self.floods += 1
+            return True
+        sent.append(now)
+        return False
+
+    def _m_forwardMessages(self, p):
+        dst = p["chat_id"]
+        with self._lock:
+            if dst not in self._chats:
+                return None, {"@type": "error", "code": 400, "message": "Chat not found"}
+            if self._flooded(dst):
+                return None, {"@type": "error", "code": 429,
+                              "message": f"Too Many Requests: retry after {self.flood_wait}"}
+            if self._rng.random() < self.batch_error_rate:
+                return None, {"@type": "error", "code": 500, "message": "Internal Server Error"}
+            history = self._history.get(p["from_chat_id"], [])
+            out = []
+            for mid in p["message_ids"]:
+                src_msg = _find(history, mid)
+                if src_msg is None or self._rng.random() < self.failure_rate:
+                    out.append(None)
+                    continue
+                self._next_id += 1 << 20
+                copy = dict(src_msg, id=self._next_id, chat_id=dst)
+                self.forwarded.setdefault(dst, []).append(src_msg)
+                out.append(copy)
+        if self.confirm_sends:
+            sent, out = out, [m and dict(m, id=m["id"] + 1) for m in out]
+            for m, temp in zip(sent, out):
+                if m is None:
+                    continue
+                if self._rng.random() < self.send_failure_rate:
+                    update = {"@type": "updateMessageSendFailed", "message": temp,
+                              "old_message_id": temp["id"],
+                              "error": {"@type": "error", "code": 400, "message": "MEDIA_EMPTY"}}
+                else:
+                    update = {"@type": "updateMessageSendSucceeded", "message": m,
+                              "old_message_id": temp["id"]}
+                if self.hold_sends:
+                    with self._lock:
+                        self.sending[(dst, temp["id"])] = update
+                else:
+                    self.emit(update)
+        return {"@type": "messages", "total_count": len(out), "messages": out}, None
+
+    def _m_getMessage(self, p):
+        with self._lock:
+            held = self.sending.get((p["chat_id"], p["message_id"]))
+            if held is not None:
+                return dict(held["message"], id=p["message_id"], sending_state={
+                    "@type": "messageSendingStatePending"}), None
+            message = _find(self._history.get(p["chat_id"], []), p["message_id"])
+        if message is not None:
+            return message, None
+        return None, {"@type": "error", "code": 404, "message": "Not Found"}
+
+    def _m_getMessages(self, p):
+        with self._lock:
+            history = self._history.get(p["chat_id"], [])
+            found = [_find(history, mid) for mid in p["message_ids"]]
+        return {"@type": "messages", "total_count": len(found), "messages": found}, None
+
+    def _m_editMessageText(self, p):
+        self.edited.append((p["chat_id"], p["message_id"], "editMessageText"))
+        return {"@type": "message", "id": p["message_id"], "chat_id": p["chat_id"]}, None
+
+    def _m_editMessageCaption(self, p):
+        self.edited.append((p["chat_id"], p["message_id"], "editMessageCaption"))
+        return {"@type": "message", "id": p["message_id"], "chat_id": p["chat_id"]}, None
+
+    def _m_deleteMessages(self, p):
+        self.deleted.setdefault(p["chat_id"], []).extend(p["message_ids"])
+        return {"@type": "ok"}, None
+
+    _SEARCH_TYPES = {
+        "searchMessagesFilterPhoto": {"messagePhoto"},
+        "searchMessagesFilterVideo": {"messageVideo"},
+        "searchMessagesFilterPhotoAndVideo": {"messagePhoto", "messageVideo"},
+        "searchMessagesFilterDocument": {"messageDocument"},
+        "searchMessagesFilterAudio": {"messageAudio"},
+        "searchMessagesFilterVoiceNote": {"messageVoiceNote"},
+        "searchMessagesFilterAnimation": {"messageAnimation"},
+    }
+
+    def _m_searchChatMessages(self, p):
+        types = self._SEARCH_TYPES.get(p.get("filter", {}).get("@type"))
+        query = (p.get("query") or "").lower()
+        start = p.get("from_message_id") or float("inf")
+        found = []
+        with self._lock:
+            for m in reversed(self._history.get(p["chat_id"], [])):
+                if m["id"] > start:
+                    continue
+                content = m["content"]
+                if types is not None and content["@type"] not in types:
+                    continue
+                text = (content.get("text") or content.get("caption") or {}).get("text", "")
+                if query and query not in text.lower():
+                    continue
+                found.append(m)
+                if len(found) == min(p.get("limit", 100), 100):
+                    break
+        next_id = found[-1]["id"] - 1 if len(found) == min(p.get("limit", 100), 100) else 0
+        return {"@type": "foundChatMessages", "total_count": len(found),
+                "messages": found, "next_from_message_id": next_id}, None
+
+    def _m_getChatMessageByDate(self, p):
+        with self._lock:
+            history = self._history.get(p["chat_id"], [])
+            lo, hi = 0, len(history)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if history[mid]["date"] <= p["date"]:  # last message *at or before* the date
+                    lo = mid + 1
+                else:
+                    hi = mid
+        if not lo:
+            return None, {"@type": "error", "code": 404, "message": "Not Found"}
+        return history[lo - 1], None
@@ -1,31 +1,88 @@
-"""TeleCopy — copy/forward Telegram messages between chats via TDLib."""
+"""TeleCopy — copy/forward Telegram messages between chats via TDLib.
 
+Run without arguments for the interactive menu, or headless (cron, systemd)::
+
+    python main.py sync --pair -1001:-1002,-1003 --mode incremental
+    python main.py sync --mode date --since 2024-01-01 --until 2024-01-31
+    python main.py sync --mode live
+
+See ``python main.py sync --help``.
+"""
+
+import argparse
 import os
+import signal
 import sys
 import hashlib
 import shutil
 import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import threading
+import queue
 import time
 import re
+import asyncio
 import atexit
-from datetime import datetime, timezone
+from collections import deque
 from dotenv import load_dotenv, set_key, find_dotenv
-from telegram.client import Telegram
-from tqdm import tqdm
+
+import aio
+from atomicfile import write_json_atomic
+from archive import ChatArchive, parse_date
+from chatdir import UPDATES as CHAT_UPDATES, ChatDirectory
+import metrics
+import tracing
+from copymap import CompactCopyMap, CopyJournal, CopyMapStore
+from dedup import ContentDedup, fingerprint
+from msgindex import MessageIndex
+from ratelimit import AdaptiveRateLimiter
+from retry import DeadLetterQueue, RetryScheduler
 
 # ── Logging ────────────────────────────────────────────────────────────────────
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("telecopy.log"),
-    ],
-)
 log = logging.getLogger("telecopy")
 
+
+def setup_logging(level: int = logging.INFO, path: str = "telecopy.log"):
+    """Log to the console and *path* through a queue drained by a listener thread.
+
+    Copy loops, live workers and the TDLib update thread then only enqueue
+    records and never wait on terminal or disk I/O.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, QueueHandler) for h in root.handlers):
+        return
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers = [logging.StreamHandler(), logging.FileHandler(path)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers)
+    root.setLevel(level)
+    root.addHandler(QueueHandler(records))
+    listener.start()
+    atexit.register(listener.stop)  # registered first, so it flushes last
+
+
+def progress_bar(**kwargs):
+    """Return a tqdm progress bar, hidden when stderr is not a terminal (cron, systemd, pipes)."""
+    from tqdm import tqdm
+    if not sys.stderr.isatty():
+        kwargs["disable"] = True
+    return tqdm(**kwargs)
+
+# ── Filtered copy modes → TDLib SearchMessagesFilter ───────────────────────────
+SEARCH_FILTERS = {
+    "photo":     "searchMessagesFilterPhoto",
+    "video":     "searchMessagesFilterVideo",
+    "media":     "searchMessagesFilterPhotoAndVideo",
+    "document":  "searchMessagesFilterDocument",
+    "audio":     "searchMessagesFilterAudio",
+    "voice":     "searchMessagesFilterVoiceNote",
+    "animation": "searchMessagesFilterAnimation",
+    "link":      "searchMessagesFilterUrl",
+}
+
 # ── Service-message types that should not be forwarded ────────────────────────
 EXCLUDE_TYPES = frozenset({
     "messageChatChangePhoto", "messageChatChangeTitle",
@@ -37,11 +94,852 @@ EXCLUDE_TYPES = frozenset({
     "messageVideoChatScheduled", "messageProximityAlertTriggered",
 })
 
-COPY_MAP_PATH = "data/copy_map.json"
+COPY_MAP_DIR = "data/copy_maps"             # one <src>_<dst>.snap/.journal per pair
+SINGLE_COPY_MAP_PATH = "data/copy_map"       # pre-routes single-pair journal, migrated on load
+LEGACY_COPY_MAP_PATH = "data/copy_map.json"  # pre-journal format, migrated on load
 SESSION_CFG_PATH = "data/last_session_config.json"
+CHECKPOINT_PATH = "data/checkpoints.json"  # per-pair newest fully-copied message ID
+RATE_LIMITS_PATH = "data/rate_limits.json"  # learned send rate per destination chat
+DEAD_LETTER_PATH = "data/dead_letters.jsonl" # messages that exhausted their attempts
+MESSAGE_INDEX_PATH = "data/messages.db"      # SQLite index of source-chat message metadata
+CHAT_DIRECTORY_PATH = "data/chats.json"      # cached chat list for the chat picker
+LIVE_STATE_PATH = "data/live_state.json"     # per-source ID live mode has handled up to
+DEDUP_PATH = "data/dedup.db"                 # content fingerprints copied per destination
+SENDING_PATH = "data/sending.json"           # copies still waiting for their permanent ID
 SAVE_EVERY = 50          # flush copy-map to disk after every N new copies
 MAX_COPY_ATTEMPTS = 5    # max forwarding attempts before giving up on a message
+FORWARD_BATCH = 100      # max message IDs per forwardMessages call (TDLib limit)
+HISTORY_QUEUE_PAGES = 8  # max history pages fetched ahead of the forwarder
+FANOUT_LAG_PAGES = 64    # pages (> HISTORY_QUEUE_PAGES) a fan-out destination may lag before fetching alone
+FORWARD_WINDOW = 8       # max forwardMessages requests in flight per copy job
+OLDEST_MESSAGE_ID = 1 << 20  # TDLib ID of server message 1 — the start of any chat
+TEMP_ID_MASK = (1 << 20) - 1 # set bits here mark a TDLib ID of a message still being sent
+SENDING_TRACK_MAX = 50_000   # max copies awaiting their permanent ID that are tracked
+SEND_CONFIRM_TIMEOUT = 30    # seconds to wait at shutdown for copies still being sent
 MAX_FLOOD_WAIT = 300     # cap server-requested FloodWait to this many seconds
+FLOOD_WAIT_RE = re.compile(r"(?:flood_wait_|retry after )(\d+)", re.IGNORECASE)
+# Errors about the destination chat itself: no message can be sent there.
+DESTINATION_ERROR_RE = re.compile(
+    r"chat not found|chat_id_invalid|peer_id_invalid|channel_private|chat_write_forbidden"
+    r"|have no write access|chat_admin_required|user_banned_in_channel|chat_restricted",
+    re.IGNORECASE,
+)
+# Errors that may mean a message was deleted from the source chat.
+MISSING_ERROR_RE = re.compile(r"message not found|message_id_invalid|message_ids_empty", re.IGNORECASE)
+# Errors that say nothing about the batch's messages: the batch is retried whole.
+TRANSIENT_ERROR_RE = re.compile(
+    r"no response from tdlib|internal server error|timeout|timed out", re.IGNORECASE,
+)
+LIVE_QUEUE_SIZE = 10_000 # max live updates buffered per worker
+LIVE_STATS_EVERY = 30    # seconds between live-queue status reports
+CHAT_PAGE_SIZE = 20      # chats per page in the chat picker
+SYNC_MODES = ("incremental", "full", "date", "live")  # `main.py sync --mode`
+
+# Exit codes of `main.py sync`.
+EXIT_OK = 0
+EXIT_INCOMPLETE = 1    # finished, but some messages were dead-lettered
+EXIT_USAGE = 2         # bad arguments, missing credentials or no routes
+EXIT_ERROR = 3         # could not connect / log in, a destination refused copies, or a crash
+EXIT_INTERRUPTED = 130 # stopped by Ctrl+C or SIGTERM before finishing
+
+
+def parse_routes(spec: str) -> dict:
+    """Parse ``"SRC:DST[,DST…][;SRC:DST…]"`` into ``{source: (destination, …)}``.
+
+    Entries for the same source are merged.  Raises ValueError on malformed
+    entries or a chat routed to itself.
+    """
+    routes: dict[int, tuple] = {}
+    for entry in spec.replace("\n", ";").split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        src_raw, sep, dsts_raw = entry.partition(":")
+        if not sep:
+            raise ValueError(f"route '{entry}' is not SOURCE:DESTINATION")
+        try:
+            src = int(src_raw)
+            dsts = [int(d) for d in dsts_raw.split(",") if d.strip()]
+        except ValueError:
+            raise ValueError(f"route '{entry}' contains a non-integer chat ID") from None
+        if not dsts:
+            raise ValueError(f"route '{entry}' has no destination")
+        if src in dsts:
+            raise ValueError(f"route '{entry}' forwards chat {src} to itself")
+        current = routes.get(src, ())
+        routes[src] = current + tuple(dict.fromkeys(d for d in dsts if d not in current))
+    return routes
+
+
+def format_routes(routes: dict) -> str:
+    return ";".join(f"{src}:{','.join(map(str, dsts))}" for src, dsts in routes.items())
+
+
+def flood_wait(error):
+    """Return the FloodWait in seconds that *error* reports, or None if it is not one."""
+    # MTProto reports FLOOD_WAIT_<n>; TDLib rewrites it as a 429
+    # "Too Many Requests: retry after <n>".
+    match = FLOOD_WAIT_RE.search(str(error))
+    return int(match.group(1)) if match else None
+
+
+class DestinationError(Exception):
+    """A forward was rejected for a reason that applies to the whole destination chat."""
+
+
+def _put_bounded(d: dict, key, value, limit: int = SENDING_TRACK_MAX):
+    """Set ``d[key]``, dropping the oldest entry once *d* holds more than *limit*."""
+    d[key] = value
+    if len(d) > limit:
+        del d[next(iter(d))]
+
+
+def album_id(message: dict):
+    """Return the message's media album ID, or None if it is not part of an album."""
+    # TDLib serialises int64 fields as strings; "0" means "no album".
+    return int(message.get("media_album_id") or 0) or None
+
+
+def album_chunks(messages, size: int = FORWARD_BATCH):
+    """Group *messages* (oldest first) into lists of at most *size*, never splitting an album.
+
+    Works on streams: a chunk is yielded as soon as the next message would
+    overflow it, carrying a trailing, possibly unfinished album over to the
+    next chunk instead of cutting it in two.
+    """
+    chunk: list = []
+    album, album_start = None, 0
+    for m in messages:
+        a = album_id(m)
+        if a is None or a != album:
+            album, album_start = a, len(chunk)
+        chunk.append(m)
+        if len(chunk) > size:
+            cut = album_start if album is not None and album_start else size
+            yield chunk[:cut]
+            chunk = chunk[cut:]
+            album_start = max(0, album_start - cut)
+    if chunk:
+        yield chunk
+
+
+class LiveWorkerPool:
+    """Forward live messages on worker threads instead of the TDLib update thread.
+
+    Each message is submitted once per ``(source, destination)`` route it
+    must reach.  Destinations are spread over the workers round-robin, so
+    every message bound for one destination is handled by the same worker
+    in arrival order, while a FloodWait or back-off sleep on one destination
+    never blocks the update thread or the other workers.  Whatever has
+    queued up while a worker was busy is handed to *forward* route by route
+    (up to FORWARD_BATCH messages per batch).
+    Messages *forward* reports as failed are parked in the worker's own
+    RetryScheduler and retried between batches rather than slept on.
+
+    TDLib delivers each part of a media album as a separate updateNewMessage,
+    so while the newest message in a batch belongs to an album the worker
+    keeps collecting for up to *album_window* seconds, letting the whole
+    album go out in one forwardMessages call.
+    """
+
+    def __init__(self, forward, dead, workers: int, album_window: float = 1.0,
+                 queue_size: int = LIVE_QUEUE_SIZE):
+        self._forward = forward  # forward(route, messages) -> {msg ID: error}
+        self._dead = dead        # dead(route, message, error) — attempts exhausted
+        self._album_window = album_window
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, workers))]
+        self._busy_since: list = [None] * len(self._queues)  # enqueue time of batch in flight
+        self._shards: dict[int, int] = {}  # destination chat → worker, assigned round-robin
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        for i in range(len(self._queues)):
+            t = threading.Thread(target=self._run, args=(i,), name=f"telecopy-live-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, route: tuple, message: dict):
+        """Queue *message* for the ``(source, destination)`` *route*."""
+        shard = self._shards.get(route[1])
+        if shard is None:
+            shard = self._shards.setdefault(route[1], len(self._shards) % len(self._queues))
+        q = self._queues[shard]
+        item = (time.monotonic(), route, message)
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            log.warning("Live queue full (%d messages) — waiting for workers to catch up.", q.maxsize)
+            q.put(item)
+
+    def stats(self):
+        """Return ``(queued messages, lag in seconds of the oldest unforwarded message)``."""
+        now = time.monotonic()
+        depth, oldest = 0, None
+        for q, busy in zip(self._queues, self._busy_since):
+            with q.mutex:
+                depth += len(q.queue)
+                head = q.queue[0][0] if q.queue else None
+            for t in (busy, head):
+                if t is not None and (oldest is None or t < oldest):
+                    oldest = t
+        return depth, (now - oldest) if oldest is not None else 0.0
+
+    def stop(self, timeout: float = 10.0):
+        """Let workers finish what is already queued, waiting up to *timeout* seconds."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        depth, _ = self.stats()
+        if depth:
+            log.warning("Live monitoring stopped with %d message(s) still queued.", depth)
+
+    def _run(self, idx: int):
+        q = self._queues[idx]
+        retries = RetryScheduler(MAX_COPY_ATTEMPTS)
+        while True:
+            due = retries.pop_due()
+            if due:
+                self._send(due, retries)
+            wait = retries.next_due_in()
+            try:
+                first = q.get(timeout=0.5 if wait is None else min(0.5, wait))
+            except queue.Empty:
+                if self._stop.is_set():
+                    # Parked messages would otherwise be lost — keep them replayable.
+                    for _, route, message in retries.drain():
+                        self._dead(route, message, "live monitoring stopped before retry")
+                    return
+                continue
+            batch = [first]
+            while True:
+                in_album = album_id(batch[-1][2]) is not None
+                if len(batch) >= FORWARD_BATCH and not in_album:
+                    break
+                try:
+                    if in_album and self._album_window > 0:
+                        batch.append(q.get(timeout=self._album_window))
+                    else:
+                        batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            self._busy_since[idx] = first[0]
+            try:
+                self._send(batch, retries)
+            finally:
+                self._busy_since[idx] = None
+
+    def _send(self, batch: list, retries: RetryScheduler):
+        """Forward ``(enqueue time, route, message)`` items, parking or dead-lettering failures."""
+        # A shard can hold several routes; forward each one's run in order.
+        runs: list = []
+        for item in batch:
+            if runs and runs[-1][-1][1] == item[1]:
+                runs[-1].append(item)
+            else:
+                runs.append([item])
+        for run in runs:
+            route = run[0][1]
+            try:
+                failed = self._forward(route, [message for _, _, message in run])
+            except Exception as e:
+                log.error("Live worker error: %s", e)
+                failed = {message["id"]: str(e) for _, _, message in run}
+            for item in run:
+                key = (route, item[2]["id"])
+                error = failed.get(item[2]["id"])
+                if error is None:
+                    retries.done(key)
+                elif not retries.park(key, item, error):
+                    self._dead(route, item[2], error)
+
+
+class MirrorWorker:
+    """Apply source edits and deletions to their copies on a thread of its own.
+
+    Jobs are ``(action, route, source message IDs)`` and run in arrival
+    order through *apply*.  A job that raises — typically because a copy is
+    still waiting for its permanent ID — is parked in a RetryScheduler and
+    given up on, with an error, after MAX_COPY_ATTEMPTS.
+    """
+
+    def __init__(self, apply):
+        self._apply = apply  # apply(action, route, src_ids); raises to retry
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telecopy-mirror", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, action: str, route: tuple, src_ids):
+        self._queue.put((action, route, tuple(src_ids)))
+
+    def stop(self, timeout: float = 10.0):
+        """Finish the queued jobs, waiting up to *timeout* seconds."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        retries = RetryScheduler(MAX_COPY_ATTEMPTS)
+        while True:
+            for job in retries.pop_due():
+                self._try(job, retries)
+            wait = retries.next_due_in()
+            try:
+                job = self._queue.get(timeout=0.5 if wait is None else min(0.5, wait))
+            except queue.Empty:
+                if self._stop.is_set():
+                    if len(retries):
+                        log.warning("Dropped %d edit/delete(s) still waiting for a retry.",
+                                    len(retries))
+                    return
+                continue
+            self._try(job, retries)
+
+    def _try(self, job: tuple, retries: RetryScheduler):
+        try:
+            self._apply(*job)
+            retries.done(job)
+        except Exception as e:
+            if not retries.park(job, job, e):
+                action, (src, dst), ids = job
+                log.error("Could not %s the copies of %s from chat %d in chat %d: %s",
+                          action, list(ids), src, dst, e)
+
+
+class AsyncCopyEngine:
+    """Copy history on one asyncio event loop instead of threads and blocking waits.
+
+    Every TDLib request is awaited through :func:`aio.wait`, so a single
+    thread keeps many of them in flight.  A copy job runs as cooperating
+    tasks: a producer pages history up to HISTORY_QUEUE_PAGES ahead of the
+    forwarder; pages are coalesced into album-preserving batches; up to
+    *window* forwardMessages requests are in flight at once, issued in order
+    and paced by the destination's rate limiter; failed messages are parked
+    and re-issued between batches; and the copy map is flushed to disk on a
+    worker thread, which holds the copy lock only to capture what to write,
+    so neither fsync nor compaction stalls the loop.
+
+    *window* defaults to ``FORWARD_WINDOW`` from .env.  Requests are sent in
+    order, but a batch that hits a FloodWait is re-sent after batches that
+    were already in flight; a window of 1 keeps strict order at the cost of
+    one round trip per batch.
+    """
+
+    def __init__(self, tc: "TeleCopy", window: int = None):
+        self.tc = tc
+        self.window = window
+
+    def _window(self) -> int:
+        if self.window:
+            return max(1, self.window)
+        try:
+            return max(1, int(os.getenv("FORWARD_WINDOW", str(FORWARD_WINDOW))))
+        except ValueError:
+            log.warning("FORWARD_WINDOW must be an integer — using %d.", FORWARD_WINDOW)
+            return FORWARD_WINDOW
+
+    @staticmethod
+    def run(coro):
+        """Run *coro* to completion on a fresh event loop and return its result."""
+        return asyncio.run(coro)
+
+    # ── TDLib requests ──────────────────────────────────────────────────────
+
+    async def message_id_at(self, chat_id: int, ts: int) -> int:
+        """Return the ID of the last message in *chat_id* sent at or before *ts* (0 if none)."""
+        local = self.tc.index.last_before(chat_id, ts + 1)
+        if local is not None:
+            return local
+        try:
+            result = await aio.wait(self.tc.tg.call_method(
+                "getChatMessageByDate", {"chat_id": chat_id, "date": ts},  # inclusive
+            ), raise_exc=True)
+        except Exception as e:
+            log.warning("getChatMessageByDate failed for chat %d: %s", chat_id, e)
+            return 0
+        if not result.update or result.update.get("@type") != "message":
+            return 0
+        return result.update["id"]
+
+    async def pages_forward(self, chat_id: int, after_id: int = 0):
+        """Yield pages of messages from *chat_id* newer than *after_id*, oldest-to-newest.
+
+        Pages forward through history by asking TDLib for the messages *newer*
+        than the cursor (a negative offset), so the oldest messages can be
+        forwarded before the rest of the history has been fetched.  Every page
+        is recorded in the message index.
+        """
+        last = after_id
+        while True:
+            try:
+                with metrics.history_latency.time(), \
+                        tracing.span("history_page", chat=chat_id, from_id=last):
+                    result = await aio.wait(self.tc.tg.get_chat_history(
+                        chat_id, limit=100,
+                        from_message_id=max(last, OLDEST_MESSAGE_ID),
+                        offset=-99,
+                    ))
+                metrics.history_pages.inc()
+                if result.update is None:
+                    log.error("No response from TDLib while fetching messages (chat %d).", chat_id)
+                    return
+                # Drop the cursor message itself (and anything older TDLib pads
+                # the page with); an empty remainder means we reached the end.
+                page = sorted(
+                    (m for m in result.update.get("messages", []) if m["id"] > last),
+                    key=lambda m: m["id"],
+                )
+                if not page:
+                    return
+                self.tc.index.add_page(chat_id, page, last)
+                yield page
+                last = page[-1]["id"]
+            except Exception as e:
+                log.error("Error fetching messages: %s", e)
+                return
+
+    async def history(self, chat_id: int, after_id: int = 0):
+        """Like :meth:`pages_forward`, but read the part of history the message index covers locally.
+
+        Only messages newer than the index's coverage are fetched from TDLib.
+        """
+        upto = self.tc.index.coverage(chat_id)
+        if upto > after_id:
+            log.info("Reading chat %d up to message %d from the local index.", chat_id, upto)
+        for page in self.tc.index.pages(chat_id, after_id, upto):
+            yield page
+        async for page in self.pages_forward(chat_id, max(after_id, upto)):
+            yield page
+
+    async def search_pages(self, chat_id: int, search_filter: str = None, query: str = "",
+                           before_id: int = 0, after_id: int = 0):
+        """Yield pages of the messages of *chat_id* that TDLib's search matches, newest first.
+
+        The server applies *search_filter* (a ``searchMessagesFilter*`` type)
+        and the text *query*, so only matching messages are transferred.
+        Searches messages older than *before_id* (0 = from the newest) and
+        stops at *after_id*.
+        """
+        from_id = before_id
+        while True:
+            try:
+                with metrics.history_latency.time(), \
+                        tracing.span("search_page", chat=chat_id, from_id=from_id):
+                    result = await aio.wait(self.tc.tg.call_method("searchChatMessages", {
+                        "chat_id": chat_id, "query": query, "sender_id": None,
+                        "from_message_id": from_id, "offset": 0, "limit": 100,
+                        "filter": {"@type": search_filter or "searchMessagesFilterEmpty"},
+                        "message_thread_id": 0,
+                    }), raise_exc=True)
+                metrics.history_pages.inc()
+            except Exception as e:
+                log.error("Error searching messages of chat %d: %s", chat_id, e)
+                return
+            found = result.update or {}
+            messages = found.get("messages", [])
+            page = [m for m in messages if m["id"] > after_id]
+            if page:
+                yield page
+            from_id = found.get("next_from_message_id", 0)
+            if not from_id or len(page) < len(messages):
+                return
+
+    @staticmethod
+    async def prefetch(pages, depth: int = HISTORY_QUEUE_PAGES):
+        """Drain the async iterator *pages* from a producer task, at most *depth* pages ahead."""
+        q: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        done = object()
+
+        async def produce():
+            try:
+                async for page in pages:
+                    await q.put(page)
+            except Exception as e:
+                log.error("Error fetching messages: %s", e)
+            await q.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                page = await q.get()
+                if page is done:
+                    return
+                yield page
+        finally:
+            producer.cancel()
+
+    async def forward(self, src: int, dst: int, msg_ids: list) -> list:
+        """Issue one paced forwardMessages call for *msg_ids*; see :meth:`TeleCopy._forward`."""
+        tc = self.tc
+        limiter = tc._limiter(dst)
+        data = tc._forward_params(src, dst, msg_ids)
+        flooded = False
+        while True:
+            with tracing.span("flood_wait" if flooded else "pace", chat=dst):
+                delay = limiter.reserve()
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    # A FloodWait may have arrived while this slot was pending.
+                    delay = limiter.reserve() if limiter.held() else 0
+            metrics.forward_calls.inc()
+            try:
+                with metrics.forward_latency.time(), \
+                        tracing.span("forward", chat=dst, ids=msg_ids):
+                    result = await aio.wait(
+                        tc.tg.call_method("forwardMessages", data), raise_exc=True,
+                    )
+                return tc._forward_done(dst, limiter, result, msg_ids)
+            except Exception as e:
+                tc._forward_failed(dst, limiter, e, msg_ids)
+                flooded = True
+
+    async def copy_messages(self, src: int, dst: int, msg_ids: list):
+        """Async :meth:`TeleCopy.copy_messages`: returns ``(copied, failed)`` dicts."""
+        copied: dict[int, int] = {}
+        failed: dict[int, str] = {}
+        for start in range(0, len(msg_ids), FORWARD_BATCH):
+            await self._copy_batch(src, dst, msg_ids[start:start + FORWARD_BATCH], copied, failed)
+        return copied, failed
+
+    async def _copy_batch(self, src: int, dst: int, msg_ids: list, copied: dict, failed: dict,
+                          verify: bool = True):
+        try:
+            outcome = await self.forward(src, dst, msg_ids)
+        except Exception as e:
+            outcome = e
+        suspects = self.tc._suspects(msg_ids, outcome) if verify else []
+        gone = await self.gone(src, suspects) if suspects else set()
+        for part in self.tc._settle_batch(msg_ids, outcome, copied, failed, gone):
+            await self._copy_batch(src, dst, part, copied, failed, verify=False)
+
+    async def gone(self, src: int, msg_ids: list) -> set:
+        """Async :meth:`TeleCopy._gone`."""
+        try:
+            result = await aio.wait(self.tc.tg.call_method(
+                "getMessages", {"chat_id": src, "message_ids": msg_ids},
+            ), raise_exc=True)
+        except Exception as e:
+            log.warning("getMessages failed for chat %d: %s", src, e)
+            return set()
+        return self.tc._missing(src, msg_ids, result)
+
+    # ── Copy jobs ───────────────────────────────────────────────────────────
+
+    async def _persist(self, due: asyncio.Event):
+        """Flush the copy map on a worker thread whenever *due* is set."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await due.wait()
+            due.clear()
+            await loop.run_in_executor(None, self.tc.save_copy_map)
+
+    async def copy_stream(self, src: int, dst: int, pages, total: int = None,
+                          checkpoint: str = None, desc: str = "Copying",
+                          position: int = None) -> int:
+        """Forward every not-yet-copied message in *pages* (oldest first); return the copy count.
+
+        *pages* is an async iterable of message lists.  Batches never split a
+        media album and are issued in order, with up to the engine's window
+        of them awaiting responses.  Failed messages are parked in a
+        RetryScheduler and re-issued between later batches; those that keep
+        failing are dead-lettered.  With a *checkpoint* key, the pair's
+        high-water mark advances as each batch completes, provided every
+        earlier batch has completed and no message is waiting for a retry.
+        """
+        tc = self.tc
+        done = tc._copy_map(src, dst)
+        count = 0
+        last_seen = 0
+        retries = RetryScheduler(MAX_COPY_ATTEMPTS)
+        claimed: set = set()  # content on its way to dst in this run (CONTENT_DEDUP)
+        window = asyncio.Semaphore(self._window())
+        in_flight: deque = deque()  # (task, newest ID of a fresh batch or None), issue order
+        retrying = 0                # re-issued retry batches still in flight
+        flush_due = asyncio.Event()
+        persister = asyncio.create_task(self._persist(flush_due))
+        bar = progress_bar(total=total, desc=desc, unit="msg", position=position)
+
+        async def send(chunk, retry: bool):
+            nonlocal count, retrying
+            try:
+                copied, failed = await self.copy_messages(src, dst, [m["id"] for m in chunk])
+            finally:
+                window.release()
+                if retry:
+                    retrying -= 1
+            for mid, new_id in copied.items():
+                tc._record_copy(src, dst, mid, new_id, flush=False)
+                retries.done(mid)
+                count += 1
+            tc._copied_content(dst, [m for m in chunk if m["id"] in copied])
+            if tc._pending_saves >= SAVE_EVERY:
+                flush_due.set()
+            for m in chunk:
+                error = failed.get(m["id"])
+                if error is not None and not retries.park(m["id"], m, error):
+                    tc.dead_letters.add(src, dst, m["id"], error)
+                    tc._unclaim(dst, m, claimed)
+                elif error is None and m["id"] not in copied:
+                    retries.done(m["id"])  # deleted from the source
+                    tc._unclaim(dst, m, claimed)
+            if not retry:
+                bar.update(len(chunk))
+
+        async def issue(chunk, retry: bool = False):
+            nonlocal retrying
+            await window.acquire()
+            if retry:
+                retrying += 1
+            task = asyncio.create_task(send(chunk, retry))
+            in_flight.append((task, None if retry else chunk[-1]["id"]))
+
+        async def issue_due():
+            for chunk in album_chunks(retries.pop_due()):
+                await issue(chunk, retry=True)
+
+        def settle():
+            # Batches complete out of order; the checkpoint only moves past a
+            # batch once it and everything issued before it have finished.
+            while in_flight and in_flight[0][0].done():
+                task, newest = in_flight.popleft()
+                task.result()
+                if checkpoint and newest and not retries and not retrying:
+                    tc._advance_checkpoint(checkpoint, newest)
+
+        try:
+            carry: list = []
+            async for page in pages:
+                if not page:
+                    continue
+                last_seen = page[-1]["id"]
+                fresh = tc._unique(dst, [m for m in page if m["id"] not in done], claimed)
+                bar.update(len(page) - len(fresh))
+                # The last chunk may end in an unfinished album — hold it back
+                # until the next page shows where the album stops.
+                chunks = list(album_chunks(carry + fresh))
+                carry = chunks.pop() if chunks else []
+                for chunk in chunks:
+                    await issue(chunk)
+                    await issue_due()
+                    settle()
+            if carry:
+                await issue(carry)
+            while True:
+                await issue_due()
+                settle()
+                if not in_flight and not retries:
+                    break
+                timeout = retries.next_due_in()
+                if in_flight:
+                    await asyncio.wait([in_flight[0][0]], timeout=timeout)
+                else:
+                    with tracing.span("backoff", parked=len(retries)):
+                        await asyncio.sleep(timeout)
+        finally:
+            for task, _ in in_flight:
+                task.cancel()
+            persister.cancel()
+            bar.close()
+        if checkpoint and last_seen:
+            tc._advance_checkpoint(checkpoint, last_seen)
+        return count
+
+    async def fan_out(self, src: int, targets: dict, source, checkpoints: bool = False) -> dict:
+        """Fetch the pages of *src* once and copy them to every destination concurrently.
+
+        *targets* maps each destination to the message ID after which it
+        starts; *source(after_id)* returns the async iterator of pages to copy
+        from there.  One producer fetches from the lowest start and hands each
+        page to every destination's own copy_stream — with its own progress
+        bar, copy map, retry state and rate limiter — staying at most
+        HISTORY_QUEUE_PAGES ahead of the fastest destination.  A destination
+        that falls FANOUT_LAG_PAGES behind is cut loose and pages the rest of
+        the history itself, so a slow or throttled destination never holds
+        back the others.  Returns ``{destination: copies}``.
+        """
+        queues = {dst: asyncio.Queue() for dst in targets}
+        attached = set(targets)
+        room = asyncio.Event()
+        detached = object()
+
+        async def produce():
+            try:
+                async for page in source(min(targets.values())):
+                    while attached and min(queues[d].qsize() for d in attached) >= HISTORY_QUEUE_PAGES:
+                        room.clear()
+                        await room.wait()
+                    for dst in list(attached):
+                        if queues[dst].qsize() >= FANOUT_LAG_PAGES:
+                            log.info("Destination %d fell behind — it will fetch the rest "
+                                     "of chat %d's history itself.", dst, src)
+                            attached.discard(dst)
+                            queues[dst].put_nowait(detached)
+                        else:
+                            queues[dst].put_nowait(page)
+                    if not attached:
+                        return
+            finally:
+                for dst in attached:
+                    queues[dst].put_nowait(None)
+
+        async def feed(dst):
+            q, after, last = queues[dst], targets[dst], targets[dst]
+            try:
+                while True:
+                    page = await q.get()
+                    room.set()
+                    if page is None:
+                        return
+                    if page is detached:
+                        own = self.prefetch(source(last))
+                        try:
+                            async for page in own:
+                                yield page
+                        finally:
+                            await own.aclose()
+                        return
+                    if page:
+                        last = page[-1]["id"]
+                    yield [m for m in page if m["id"] > after]
+            finally:
+                # A finished (or failed) destination must not hold the producer back.
+                attached.discard(dst)
+                room.set()
+
+        async def copy_to(dst, position):
+            pages = feed(dst)
+            key = self.tc._pair_key(src, dst) if checkpoints else None
+            try:
+                return await self.copy_stream(
+                    src, dst, pages, checkpoint=key,
+                    desc=f"→ {dst}" if len(targets) > 1 else "Copying",
+                    position=position if len(targets) > 1 else None,
+                )
+            finally:
+                await pages.aclose()
+
+        producer = asyncio.create_task(produce())
+        try:
+            results = await asyncio.gather(
+                *(copy_to(dst, i) for i, dst in enumerate(targets)), return_exceptions=True,
+            )
+        finally:
+            producer.cancel()
+        counts = {}
+        for dst, result in zip(targets, results):
+            if isinstance(result, BaseException):
+                log.error("Copying chat %d to %d failed: %s", src, dst, result)
+                metrics.copy_jobs_failed.inc()
+                result = 0
+            counts[dst] = result
+        return counts
+
+    async def copy_history(self, src: int, targets: dict, rescan: bool = False) -> dict:
+        """Copy the history of *src* to each destination after its start ID in *targets*.
+
+        The history is read once however many destinations there are — from
+        the message index as far as it reaches, then from TDLib — and each
+        pair's checkpoint advances as it goes.  With *rescan* every page comes
+        from TDLib, which also reconciles the index with the server (dropping
+        messages deleted while nobody was watching).  Returns
+        ``{destination: copies}``.
+        """
+        read = self.pages_forward if rescan else self.history
+
+        def source(after_id):
+            return self._forwardable(read(src, after_id))
+
+        return await self.fan_out(src, targets, source, checkpoints=True)
+
+    async def copy_range(self, src: int, dsts, from_ts: int = None, to_ts: int = None) -> dict:
+        """Copy the messages of *src* dated within [*from_ts*, *to_ts*] (either open) to *dsts*.
+
+        Returns ``{destination: copies}``.
+        """
+        # Seek to the last message before the range, then page forward from
+        # there, so fetch cost scales with the range rather than the chat.
+        after_id = await self.message_id_at(src, from_ts - 1) if from_ts is not None else 0
+
+        async def source(after):
+            # Filtering here, before any prefetch, stops paging at the end of the range.
+            async for page in self._forwardable(self.history(src, after)):
+                kept = [m for m in page if from_ts is None or m["date"] >= from_ts]
+                if to_ts is not None and kept and kept[-1]["date"] > to_ts:
+                    yield [m for m in kept if m["date"] <= to_ts]
+                    return  # everything after this page is newer still
+                yield kept
+
+        return await self.fan_out(src, dict.fromkeys(dsts, after_id), source)
+
+    async def copy_search(self, src: int, dsts, search_filter: str = None, query: str = "",
+                          from_ts: int = None, to_ts: int = None) -> dict:
+        """Copy the messages of *src* matching a server-side search to *dsts*, oldest first.
+
+        *search_filter* and *query* are passed to :meth:`search_pages`; the
+        optional date range bounds the search on the server side.  Messages
+        already in a pair's copy map are skipped as usual.  Returns
+        ``{destination: copies}``.
+        """
+        after_id = await self.message_id_at(src, from_ts - 1) if from_ts is not None else 0
+        before_id = 0
+        if to_ts is not None:
+            last = await self.message_id_at(src, to_ts)
+            if not last:
+                return dict.fromkeys(dsts, 0)  # nothing that old
+            before_id = last + 1  # search starts at, and includes, from_message_id
+
+        found = []
+        async for page in self.search_pages(src, search_filter, query, before_id, after_id):
+            found.extend(page)
+        found.reverse()  # search results come newest first
+        log.info("Search matched %d message(s) in chat %d.", len(found), src)
+
+        async def source(after):
+            matched = [m for m in found if m["id"] > after]
+            for i in range(0, len(matched), FORWARD_BATCH):
+                yield matched[i:i + FORWARD_BATCH]
+
+        return await self.fan_out(
+            src, dict.fromkeys(dsts, after_id), lambda after: self._forwardable(source(after)),
+        )
+
+    async def export_history(self, chat_id: int, archive: ChatArchive) -> int:
+        """Append the messages of *chat_id* newer than the archive's last one to *archive*.
+
+        Pages are written as they arrive, so memory use does not depend on
+        the size of the chat.  Returns the number of messages exported.
+        """
+        count = 0
+        bar = progress_bar(desc=f"Exporting {chat_id}", unit="msg")
+        pages = self.prefetch(self.pages_forward(chat_id, archive.last_id))
+        try:
+            with archive.writer() as writer:
+                async for page in pages:
+                    for m in page:
+                        writer.write(m)
+                    count += len(page)
+                    bar.update(len(page))
+        finally:
+            await pages.aclose()
+            bar.close()
+        return count
+
+    async def copy_ids(self, src: int, dst: int, msg_ids) -> int:
+        """Copy the given message IDs of *src* to *dst*, oldest first."""
+        ids = sorted(msg_ids)
+
+        async def one_page():
+            yield [{"id": mid} for mid in ids]
+
+        return await self.copy_stream(src, dst, one_page(), total=len(ids))
+
+    @staticmethod
+    async def _forwardable(pages):
+        async for page in pages:
+            yield [m for m in page if m.get("content", {}).get("@type") not in EXCLUDE_TYPES]
 
 
 class TeleCopy:
@@ -51,21 +949,80 @@ class TeleCopy:
         self.monitoring = False
         self.config_path = find_dotenv(usecwd=True) or ".env"
         self._pending_saves = 0
-        self._copy_lock = threading.RLock()  # RLock: _record_copy re-enters via save_copy_map
-        self.copied: dict[int, int] = {}  # source msg ID → destination msg ID
+        self._copy_lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # taken before _copy_lock, never while holding it
+        self.copy_maps = CopyMapStore(COPY_MAP_DIR)  # (src, dst) → {source msg ID: destination msg ID}
+        self.dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+        self.index = MessageIndex(MESSAGE_INDEX_PATH)  # source-chat message metadata
+        self.chats = ChatDirectory(CHAT_DIRECTORY_PATH)
+        self.checkpoints: dict[str, int] = {}  # "src:dst" → newest fully-copied msg ID
+        self._checkpoints_dirty = False
+        self._limiters: dict[int, AdaptiveRateLimiter] = {}  # destination chat → limiter
+        self._learned_rates: dict[str, float] = {}
+        self._rates_dirty = False
+        # Copies forwarded with a temporary ID, until TDLib reports the permanent one:
+        self._sending: dict[tuple, tuple] = {}  # (dst, temporary ID) → (src, source msg ID)
+        self._sent_early: dict[tuple, object] = {}  # (dst, temporary ID) → permanent ID, or error
+        self._sending_dirty = False
+        self.engine = AsyncCopyEngine(self)
+        self.route_override: dict = None  # routes given on the command line, instead of .env
         self._load_config()
+        self.dedup = self._open_dedup()
+        self._start_metrics()
+        self._start_tracing()
         atexit.register(self.save_copy_map)
+        atexit.register(self.chats.save)
 
     # ── Configuration ───────────────────────────────────────────────────────
 
     def _load_config(self):
         load_dotenv(self.config_path)
         os.makedirs("data", exist_ok=True)
-        self.copied = self._load_copy_map()
+        self._migrate_copy_map()
+        self.checkpoints = self._load_checkpoints()
+        self._learned_rates = self._load_rates()
+        self._sending.update(self._load_sending())
+
+    @staticmethod
+    def _open_dedup():
+        """Return the content-dedup index if CONTENT_DEDUP is enabled in .env, else None."""
+        if os.getenv("CONTENT_DEDUP", "false").lower() != "true":
+            return None
+        try:
+            max_entries = int(os.getenv("DEDUP_MAX_ENTRIES", "1000000"))
+            max_age_days = float(os.getenv("DEDUP_MAX_AGE_DAYS", "90"))
+        except ValueError:
+            log.warning("DEDUP_MAX_ENTRIES / DEDUP_MAX_AGE_DAYS must be numbers — using defaults.")
+            max_entries, max_age_days = 1_000_000, 90.0
+        return ContentDedup(DEDUP_PATH, max_entries, max_age_days * 86400 or None)
+
+    @staticmethod
+    def _start_metrics():
+        """Start the optional metrics exporters configured in .env."""
+        port_raw = os.getenv("METRICS_PORT", "").strip()
+        try:
+            port = int(port_raw) if port_raw else None
+        except ValueError:
+            log.warning("METRICS_PORT '%s' is not a valid integer — endpoint disabled.", port_raw)
+            port = None
+        metrics.start_exporters(port, os.getenv("STATS_FILE", "").strip() or None)
+
+    @staticmethod
+    def _start_tracing():
+        """Enable the optional trace file and whole-run profiler configured in .env."""
+        trace_path = os.getenv("TRACE_FILE", "").strip()
+        if trace_path:
+            tracing.enable(trace_path)
+        profile = os.getenv("PROFILE", "").strip()
+        if profile:
+            tracing.start_profiler(profile, os.getenv("PROFILE_FILE", "").strip() or None)
+
+    @staticmethod
+    def _missing_credentials() -> list:
+        return [v for v in ("PHONE", "API_ID", "API_HASH") if not os.getenv(v)]
 
     def check_env_vars(self):
-        required = ["PHONE", "API_ID", "API_HASH"]
-        missing = [v for v in required if not os.getenv(v)]
+        missing = self._missing_credentials()
         if missing:
             log.warning("Missing env values: %s", missing)
             for var in missing:
@@ -85,9 +1042,19 @@ class TeleCopy:
             f"{api_id}\x00{api_hash}\x00{phone}".encode()
         ).hexdigest()
 
-    def handle_connection(self):
-        self.check_env_vars()
+    def handle_connection(self, interactive: bool = True):
+        """Connect to Telegram with the credentials in .env, resetting the session if they changed.
+
+        With *interactive* false nothing is prompted for: missing credentials
+        raise ValueError, and a session that is not logged in yet raises
+        RuntimeError instead of asking for the login code.
+        """
+        if interactive:
+            self.check_env_vars()
         load_dotenv(self.config_path, override=True)
+        missing = self._missing_credentials()
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)} in {self.config_path}")
         api_id = os.getenv("API_ID", "")
         api_hash = os.getenv("API_HASH", "")
         phone = os.getenv("PHONE", "")
@@ -109,22 +1076,28 @@ class TeleCopy:
                     pass
                 self.tg = None
                 self.session_active = False
+            self._clear_copy_map()  # closes the journal before data/ is removed
+            self.index.close()
+            self.chats.clear()
+            if self.dedup:
+                self.dedup.close()
             for d in ("tdlib-session", "data"):
                 try:
                     shutil.rmtree(d)
                 except FileNotFoundError:
                     pass
-            self.copied.clear()
-            self._pending_saves = 0
 
         os.makedirs("data", exist_ok=True)
         with open(SESSION_CFG_PATH, "w") as f:
             json.dump({"fingerprint": new_fp}, f)
 
-        self._init_telegram()
+        self._init_telegram(blocking=interactive)
         log.info("✅ Connected to Telegram.")
 
-    def _init_telegram(self):
+    def _init_telegram(self, blocking: bool = True):
+        # Heavy (loads the TDLib binding): imported only when connecting.
+        from telegram.client import AuthorizationState, Telegram
+
         # Stop any previously-created client so its background threads do not
         # leak when the user reconnects (menu option 0) without restarting.
         if self.tg:
@@ -152,356 +1125,1099 @@ class TeleCopy:
             proxy_port=proxy_port,
             proxy_type={"@type": proxy_type} if proxy_type else None,
         )
-        self.tg.login()
+        state = self.tg.login(blocking=blocking)
+        if not blocking and state != AuthorizationState.READY:
+            raise RuntimeError(
+                f"Telegram session is not logged in ({state.name}) — "
+                "log in once from the interactive menu (option 0)"
+            )
+        for kind in CHAT_UPDATES:
+            self.tg.add_update_handler(kind, self.chats.handle_update)
+        for kind in ("updateMessageSendSucceeded", "updateMessageSendFailed"):
+            self.tg.add_update_handler(kind, self._on_send_result)
         self.session_active = True
+        self._resolve_sending()
 
     # ── Chat selection ──────────────────────────────────────────────────────
 
     def set_chats(self):
-        self._list_chats()
-        load_dotenv(self.config_path, override=True)
-        old_src = os.getenv("SOURCE", "")
-        old_dst = os.getenv("DESTINATION", "")
+        """Add, change or remove the route of one source chat.
+
+        Each (source, destination) pair keeps its own copy map, so editing
+        routes never discards copy history.
+        """
+        self._browse_chats()
+        try:
+            routes = self._read_routes()
+        except ValueError as e:
+            log.warning("Ignoring invalid routes in .env (%s).", e)
+            routes = {}
+        if routes:
+            print("\nCurrent routes:")
+            for s, dsts in routes.items():
+                print(f"  {s} → {', '.join(map(str, dsts))}")
         src = input("Enter source chat ID: ").strip()
-        dst = input("Enter destination chat ID: ").strip()
-        set_key(self.config_path, "SOURCE", src)
-        set_key(self.config_path, "DESTINATION", dst)
-        # Message IDs are only unique within a single (source, destination) pair.
-        # If either chat changes, stale copy-map entries would suppress forwarding
-        # to the new destination or wrongly attribute IDs from a different source.
-        if (src != old_src and old_src) or (dst != old_dst and old_dst):
-            self.copied.clear()
-            self._pending_saves = 0
-            try:
-                os.remove(COPY_MAP_PATH)
-            except FileNotFoundError:
-                pass
-            log.info("Chat configuration changed — copy history cleared.")
-        log.info("✅ Source and destination saved.")
-
-    def _list_chats(self):
-        seen: set[int] = set()
-        # TDLib requires the initial offset_order to be Int64.MAX so that
-        # the first page returns the chats with the highest sort order.
-        # Starting at 0 would request chats with order < 0, yielding nothing.
-        offset_order = sys.maxsize
-        offset_chat_id = 0
-        while True:
-            result = self.tg.get_chats(limit=200, offset_order=offset_order, offset_chat_id=offset_chat_id)
-            result.wait()
-            if not result.update:
-                if not seen:
-                    log.error("Failed to retrieve chat list.")
-                return
-            chat_ids = result.update.get("chat_ids", [])
-            if not chat_ids:
+        dsts = input(
+            "Enter destination chat ID(s), comma-separated [blank = remove this source]: "
+        ).strip()
+        try:
+            src_id = int(src)
+            if dsts:
+                routes[src_id] = parse_routes(f"{src}:{dsts}")[src_id]
+            elif routes.pop(src_id, None) is None:
+                log.info("Chat %d has no route.", src_id)
                 return
-            new_ids = [cid for cid in chat_ids if cid not in seen]
-            if not new_ids:
+        except ValueError as e:
+            log.error("Invalid route: %s", e)
+            return
+        set_key(self.config_path, "ROUTES", format_routes(routes))
+        # A SOURCE/DESTINATION pair from older versions now lives in ROUTES.
+        set_key(self.config_path, "SOURCE", "")
+        set_key(self.config_path, "DESTINATION", "")
+        log.info("✅ Routes saved (%d source chat(s)).", len(routes))
+
+    def _refresh_chats(self):
+        log.info("Loading chat list…")
+        count = self.engine.run(self.chats.refresh(self.tg))
+        log.info("%d chats loaded.", count)
+
+    def _browse_chats(self):
+        """Page through the cached chat directory, with substring search.
+
+        The directory is loaded from TDLib only the first time (or on 'r');
+        afterwards it opens from disk and chat updates keep it current.
+        """
+        if not len(self.chats):
+            self._refresh_chats()
+        query, page = "", 0
+        matches = self.chats.search(query)
+        while True:
+            pages = max(1, -(-len(matches) // CHAT_PAGE_SIZE))
+            label = f" matching '{query}'" if query else ""
+            print(f"\nChats{label} — page {page + 1}/{pages}, {len(matches)} chat(s):")
+            for chat in matches[page * CHAT_PAGE_SIZE:(page + 1) * CHAT_PAGE_SIZE]:
+                print(f"  {chat['id']:>16}  {chat['title'] or '(untitled)'}  [{chat['type']}]")
+            cmd = input(
+                "Text to search, n/p = next/previous page, * = all, r = reload, Enter = done: "
+            ).strip()
+            if not cmd:
                 return
-            if not seen:
-                log.info("Available chats:")
-            last_update = None
-            for cid in new_ids:
-                seen.add(cid)
-                r = self.tg.get_chat(cid)
-                r.wait()
-                title = r.update.get("title", "Private Chat") if r.update else str(cid)
-                print(f"  {cid}: {title}")
-                if cid == chat_ids[-1]:
-                    last_update = r.update  # cache to reuse as pagination cursor
-            # TDLib uses (order, chat_id) as the pagination cursor for get_chats.
-            # The last chat in the batch is the new offset for the next page.
-            # Reuse the already-fetched update when possible to avoid a redundant
-            # API call, but if chat_ids[-1] was already in `seen` (TDLib can
-            # return slight overlaps when sort-order shifts in real-time), the
-            # loop above never touches it, so fetch it separately.
-            if last_update is None:
-                r = self.tg.get_chat(chat_ids[-1])
-                r.wait()
-                last_update = r.update
-            if last_update:
-                offset_order = last_update.get("order", 0)
-                offset_chat_id = chat_ids[-1]
+            if cmd.lower() == "n":
+                page = min(page + 1, pages - 1)
+                continue
+            if cmd.lower() == "p":
+                page = max(page - 1, 0)
+                continue
+            if cmd.lower() == "r":
+                self._refresh_chats()
             else:
-                return
-            # If fewer results than requested, we've reached the end.
-            if len(chat_ids) < 200:
-                return
+                query = "" if cmd == "*" else cmd
+            matches, page = self.chats.search(query), 0
+
+    def _read_routes(self) -> dict:
+        """Return ``{source: (destination, …)}`` from ROUTES plus any SOURCE/DESTINATION pair.
 
-    def _validate_chats(self):
+        Raises ValueError if the configuration is malformed.
+        """
         load_dotenv(self.config_path, override=True)
-        src = os.getenv("SOURCE")
-        dst = os.getenv("DESTINATION")
-        if not src or not dst:
-            log.error("SOURCE and DESTINATION must be set first (option 1).")
-            return None, None
+        spec = os.getenv("ROUTES", "").strip()
+        src = os.getenv("SOURCE", "").strip()
+        dst = os.getenv("DESTINATION", "").strip()
+        if src or dst:
+            if not (src and dst):
+                raise ValueError("SOURCE and DESTINATION must be set together")
+            spec = f"{spec};{src}:{dst}"
+        return parse_routes(spec)
+
+    def _routes(self) -> dict:
+        """Return the configured routes, or {} after logging why there are none."""
+        if self.route_override is not None:
+            return self.route_override
         try:
-            src_id, dst_id = int(src), int(dst)
-        except ValueError:
-            log.error("SOURCE and DESTINATION must be valid integer chat IDs.")
-            return None, None
-        if src_id == dst_id:
-            log.error("SOURCE and DESTINATION must be different chats.")
-            return None, None
-        return src_id, dst_id
+            routes = self._read_routes()
+        except ValueError as e:
+            log.error("Invalid routes: %s.", e)
+            return {}
+        if not routes:
+            log.error("No routes configured — set a source and destination first (option 1).")
+        return routes
+
+    @staticmethod
+    def _route_pairs(routes: dict) -> list:
+        return [(src, dst) for src, dsts in routes.items() for dst in dsts]
 
     # ── Copy-map persistence ────────────────────────────────────────────────
 
-    def _load_copy_map(self) -> dict:
+    def _migrate_copy_map(self):
+        """Move a copy map from before per-pair maps into the store, under SOURCE → DESTINATION."""
+        single = CopyJournal(SINGLE_COPY_MAP_PATH)
+        has_json = os.path.exists(LEGACY_COPY_MAP_PATH)
+        if not single.exists() and not has_json:
+            return
         try:
-            with open(COPY_MAP_PATH) as f:
-                return {int(k): v for k, v in json.load(f).items()}
-        except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError):
-            return {}
+            src, dst = int(os.getenv("SOURCE", "")), int(os.getenv("DESTINATION", ""))
+        except ValueError:
+            log.warning(
+                "Found a copy map from an older version but SOURCE/DESTINATION are not "
+                "set — it will be migrated once they are."
+            )
+            return
+        copied = single.load()
+        if has_json:
+            # One-time migration from the old whole-file JSON format.
+            try:
+                with open(LEGACY_COPY_MAP_PATH) as f:
+                    legacy = {int(k): int(v) for k, v in json.load(f).items()}
+            except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+                bad = LEGACY_COPY_MAP_PATH + ".corrupt"
+                os.replace(LEGACY_COPY_MAP_PATH, bad)
+                log.error("Could not read %s (%s) — moved it to %s.", LEGACY_COPY_MAP_PATH, e, bad)
+            else:
+                for k, v in legacy.items():
+                    if k not in copied:
+                        copied[k] = v
+        self.copy_maps.adopt(src, dst, copied)
+        single.clear()
+        if os.path.exists(LEGACY_COPY_MAP_PATH):
+            os.remove(LEGACY_COPY_MAP_PATH)
+        log.info("Migrated %d copy-map entries to the copy map of %d → %d.", len(copied), src, dst)
 
-    def save_copy_map(self):
+    def _copy_map(self, src: int, dst: int) -> CompactCopyMap:
+        """Return the ``{source msg ID: destination msg ID}`` map of the pair."""
         with self._copy_lock:
-            os.makedirs("data", exist_ok=True)
-            with open(COPY_MAP_PATH, "w") as f:
-                json.dump(self.copied, f)
+            return self.copy_maps.get(src, dst)
+
+    def save_copy_map(self):
+        """Make recorded copies, checkpoints and learned rates durable.
+
+        ``_copy_lock`` is held only to capture what to write; fsync and
+        snapshot writes happen outside it, so copies keep being recorded
+        (and the event loop is never blocked) while a flush is on disk.
+        Flushes themselves are serialised by ``_flush_lock``.
+        """
+        with self._flush_lock, metrics.copy_map_flush.time(), tracing.span("copy_map_flush"):
+            with self._copy_lock:
+                work = self.copy_maps.begin_flush()
+                self._pending_saves = 0
+                checkpoints = dict(self.checkpoints) if self._checkpoints_dirty else None
+                self._checkpoints_dirty = False
+                sending = ([[*key, *origin] for key, origin in self._sending.items()]
+                           if self._sending_dirty else None)
+                self._sending_dirty = False
+            self.copy_maps.finish_flush(work, self._copy_lock)
+            # Checkpoints are written only after the copies they cover are durable.
+            if checkpoints is not None:
+                write_json_atomic(CHECKPOINT_PATH, checkpoints)
+            if sending is not None:
+                write_json_atomic(SENDING_PATH, sending)
+            self._save_rates()
+        self.index.flush()
+        if self.dedup:
+            self.dedup.flush()
+
+    def _clear_copy_map(self):
+        with self._flush_lock, self._copy_lock:
+            self.copy_maps.clear()
             self._pending_saves = 0
+            self.checkpoints.clear()
+            self._checkpoints_dirty = False
+            self._sending.clear()
+            self._sent_early.clear()
+            self._sending_dirty = False
+            for path in (CHECKPOINT_PATH, SENDING_PATH, LEGACY_COPY_MAP_PATH):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            CopyJournal(SINGLE_COPY_MAP_PATH).clear()
+            # Fingerprints stand for copies too; kept, they would block a re-copy.
+            if self.dedup:
+                self.dedup.clear()
+
+    # ── Send-rate pacing ────────────────────────────────────────────────────
+
+    @staticmethod
+    def _load_rates() -> dict:
+        try:
+            with open(RATE_LIMITS_PATH) as f:
+                return {str(k): float(v) for k, v in json.load(f).items()}
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def _save_rates(self):
+        if not self._limiters:
+            return
+        rates = {str(dst): round(lim.rate, 3) for dst, lim in list(self._limiters.items())}
+        # Rates also creep up on clean streaks, so compare rather than rely on the flag.
+        if not self._rates_dirty and all(self._learned_rates.get(k) == v for k, v in rates.items()):
+            return
+        self._learned_rates.update(rates)
+        write_json_atomic(RATE_LIMITS_PATH, self._learned_rates)
+        self._rates_dirty = False
 
-    def _record_copy(self, src_id: int, dst_id: int):
+    def _limiter(self, dst: int) -> AdaptiveRateLimiter:
+        """Return the rate limiter shared by every request sent to chat *dst*."""
         with self._copy_lock:
-            self.copied[src_id] = dst_id
-            self._pending_saves += 1
-            if self._pending_saves >= SAVE_EVERY:
-                self.save_copy_map()
+            limiter = self._limiters.get(dst)
+            if limiter is None:
+                rate = self._learned_rates.get(str(dst))
+                limiter = AdaptiveRateLimiter(rate) if rate else AdaptiveRateLimiter()
+                self._limiters[dst] = limiter
+            return limiter
 
-    # ── Message fetching (streaming — low RAM footprint) ────────────────────
+    # ── Incremental-sync checkpoints ────────────────────────────────────────
 
-    def _iter_messages(self, chat_id: int):
-        """Yield message objects from *chat_id*, newest-to-oldest, in batches of 100."""
-        last = 0
-        seen_ids: set[int] = set()
-        while True:
+    @staticmethod
+    def _load_checkpoints() -> dict:
+        try:
+            with open(CHECKPOINT_PATH) as f:
+                return {str(k): int(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+            log.error("Could not read %s (%s) — next copy will rescan history.", CHECKPOINT_PATH, e)
+            return {}
+
+    @staticmethod
+    def _pair_key(src: int, dst: int) -> str:
+        return f"{src}:{dst}"
+
+    def _advance_checkpoint(self, key: str, msg_id: int):
+        with self._copy_lock:
+            if msg_id > self.checkpoints.get(key, 0):
+                self.checkpoints[key] = msg_id
+                self._checkpoints_dirty = True
+
+    def _record_copy(self, src: int, dst: int, src_id: int, dst_id: int, flush: bool = True):
+        """Record that message *src_id* of *src* was copied to *dst* as *dst_id*.
+
+        With *flush*, the copy maps are also saved every SAVE_EVERY copies.
+        """
+        error = None
+        with self._copy_lock:
+            if dst_id & TEMP_ID_MASK:
+                # The copy is still being sent; its permanent ID arrives as an update.
+                final = self._sent_early.pop((dst, dst_id), None)
+                if final is None:
+                    _put_bounded(self._sending, (dst, dst_id), (src, src_id))
+                    self._sending_dirty = True
+                elif isinstance(final, str):
+                    error = final  # sending it has already failed
+                else:
+                    dst_id = final
+            if error is None:
+                self.copy_maps.record(src, dst, src_id, dst_id)
+                metrics.messages_copied.inc()
+                metrics.copy_map_entries.set(self.copy_maps.loaded_entries())
+                self._pending_saves += 1
+            due = flush and self._pending_saves >= SAVE_EVERY
+        if error is not None:
+            self._send_failed(src, dst, src_id, error)
+        elif due:
+            self.save_copy_map()
+
+    def _unique(self, dst: int, messages: list, claimed: set) -> list:
+        """Drop the *messages* whose content was already copied to *dst* (with CONTENT_DEDUP).
+
+        *claimed* is the run's set of content already on its way (see
+        :meth:`ContentDedup.unseen`); the content is only stored as copied by
+        :meth:`_copied_content` once the forward succeeds, and a message that
+        finally fails is released with :meth:`_unclaim`.
+        """
+        if self.dedup is None:
+            return messages
+        kept = self.dedup.unseen(dst, messages, claimed)
+        if len(kept) < len(messages):
+            metrics.messages_deduplicated.inc(len(messages) - len(kept))
+        return kept
+
+    def _copied_content(self, dst: int, messages: list):
+        if self.dedup is not None and messages:
+            self.dedup.add(dst, messages)
+
+    @staticmethod
+    def _unclaim(dst: int, message: dict, claimed: set):
+        claimed.discard((dst, fingerprint(message)))
+
+    def _on_send_result(self, update: dict):
+        """Replace a copy's temporary ID by its permanent one once TDLib has sent it.
+
+        If sending failed, the copy is forgotten and the source message
+        dead-lettered, to be retried with the dead-letter replay.
+        """
+        message = update["message"]
+        key = (message["chat_id"], update["old_message_id"])
+        with self._copy_lock:
+            origin = self._sending.pop(key, None)
+            if origin is not None:
+                self._sending_dirty = True
+            if update["@type"] == "updateMessageSendSucceeded":
+                if origin is None:
+                    # The update overtook the forwardMessages response; _record_copy
+                    # picks the permanent ID up from here.
+                    _put_bounded(self._sent_early, key, message["id"])
+                else:
+                    self.copy_maps.record(origin[0], key[0], origin[1], message["id"])
+                return
+            error = (update.get("error") or {}).get("message") or update.get("error_message", "unknown")
+            if origin is None:
+                _put_bounded(self._sent_early, key, error)
+                return
+            self.copy_maps.discard(origin[0], key[0], origin[1])
+        self._send_failed(origin[0], key[0], origin[1], error)
+
+    def _send_failed(self, src: int, dst: int, src_id: int, error: str):
+        log.error("Copy of message %d from chat %d to %d was not sent: %s", src_id, src, dst, error)
+        self.dead_letters.add(src, dst, src_id, error)
+
+    @staticmethod
+    def _load_sending() -> dict:
+        try:
+            with open(SENDING_PATH) as f:
+                return {(dst, temp): (src, src_id) for dst, temp, src, src_id in json.load(f)}
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError):
+            return {}
+
+    def _resolve_sending(self):
+        """Settle the copies a previous run left being sent, asking TDLib how each one ended.
+
+        TDLib keeps sending them after a restart and reports the result as
+        usual; copies that were sent or failed meanwhile are settled here.
+        """
+        with self._copy_lock:
+            keys = list(self._sending)
+        if not keys:
+            return
+        log.info("Checking %d copies left being sent by the previous run…", len(keys))
+        for dst, temp in keys:
             try:
-                result = self.tg.get_chat_history(chat_id, limit=100, from_message_id=last)
-                result.wait()
-                if result.update is None:
-                    log.error("No response from TDLib while fetching messages (chat %d).", chat_id)
-                    return
-                batch = result.update.get("messages", [])
-                if not batch:
-                    return
-                new_messages = [m for m in batch if m["id"] not in seen_ids]
-                if not new_messages:
-                    # Every message in this batch was already yielded — pagination stalled.
-                    return
-                for m in new_messages:
-                    seen_ids.add(m["id"])
-                    yield m
-                last = batch[-1]["id"]
+                message = self.tg.call_method(
+                    "getMessage", {"chat_id": dst, "message_id": temp}, block=True,
+                ).update
             except Exception as e:
-                log.error("Error fetching messages: %s", e)
-                return
+                log.warning("Could not look up copy %d:%d: %s", dst, temp, e)
+                continue
+            state = (message or {}).get("sending_state") or {}
+            if message is None:
+                # Sent while we were away, but its permanent ID is unknown:
+                # the copy map keeps the temporary one.
+                with self._copy_lock:
+                    if self._sending.pop((dst, temp), None) is not None:
+                        self._sending_dirty = True
+                log.warning("Copy %d:%d is no longer known to TDLib — it will not be "
+                            "mirrored.", dst, temp)
+            elif state.get("@type") == "messageSendingStateFailed":
+                self._on_send_result({
+                    "@type": "updateMessageSendFailed", "message": message,
+                    "old_message_id": temp,
+                    "error": state.get("error") or {"message": state.get("error_message")},
+                })
+            elif not state:
+                self._on_send_result({"@type": "updateMessageSendSucceeded",
+                                      "message": message, "old_message_id": temp})
+
+    def _wait_for_sends(self, timeout: float = SEND_CONFIRM_TIMEOUT):
+        """Give the copies still being sent up to *timeout* seconds to get their permanent IDs."""
+        deadline = time.monotonic() + timeout
+        try:
+            while self._sending and time.monotonic() < deadline:
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        if self._sending:
+            log.warning("%d copies are still being sent — the next run picks them up.",
+                        len(self._sending))
 
     # ── Message forwarding with FloodWait + exponential back-off ───────────
 
-    def copy_message(self, src: int, dst: int, msg_id: int):
-        """Forward *msg_id* from *src* to *dst*.
+    def _forward(self, src: int, dst: int, msg_ids: list) -> list:
+        """Issue one forwardMessages call for *msg_ids* and return its ``messages`` list.
 
-        Respects Telegram FloodWait delays and uses exponential back-off for
-        other transient failures.  Returns the new message ID on success,
-        or None after MAX_COPY_ATTEMPTS failed attempts.
+        Every call is paced by the destination's shared rate limiter.  FloodWait
+        responses slow that limiter down and are waited out (they do not count
+        as failures); any other error is raised.  TDLib returns results in the
+        same order as *msg_ids*, with ``None`` for each message it could not
+        forward.
         """
-        data = {
+        limiter = self._limiter(dst)
+        data = self._forward_params(src, dst, msg_ids)
+        flooded = False
+        while True:
+            # After a FloodWait, acquire() holds until the server's wait is over.
+            with tracing.span("flood_wait" if flooded else "pace", chat=dst):
+                limiter.acquire()
+            metrics.forward_calls.inc()
+            try:
+                with metrics.forward_latency.time(), \
+                        tracing.span("forward", chat=dst, ids=msg_ids):
+                    result = self.tg.call_method("forwardMessages", data, block=True)
+                return self._forward_done(dst, limiter, result, msg_ids)
+            except Exception as e:
+                self._forward_failed(dst, limiter, e, msg_ids)
+                flooded = True
+
+    @staticmethod
+    def _forward_params(src: int, dst: int, msg_ids: list) -> dict:
+        return {
             "chat_id": dst,
             "from_chat_id": src,
-            "message_ids": [msg_id],
+            "message_ids": msg_ids,
             "send_copy": os.getenv("SEND_COPY", "true").lower() == "true",
         }
-        attempt = 0
-        while attempt < MAX_COPY_ATTEMPTS:
+
+    def _forward_done(self, dst: int, limiter: AdaptiveRateLimiter, result, msg_ids: list) -> list:
+        """Check a forwardMessages *result* for *msg_ids*, credit the limiter and return its messages."""
+        msgs = self._forwarded(result, msg_ids)
+        limiter.on_success()
+        metrics.send_rate.set(limiter.rate, chat=dst)
+        return msgs
+
+    def _forward_failed(self, dst: int, limiter: AdaptiveRateLimiter, error, msg_ids: list):
+        """Slow *limiter* down if *error* is a FloodWait (the call is then re-sent); else re-raise it."""
+        wait = flood_wait(error)
+        if wait is None:
+            raise error
+        self._on_flood(dst, limiter, wait, len(msg_ids))
+
+    @staticmethod
+    def _forwarded(result, msg_ids: list) -> list:
+        """Return the ``messages`` of a forwardMessages *result*, checking it covers *msg_ids*."""
+        if result.update is None:
+            raise ValueError(f"No response from TDLib for messages {msg_ids}")
+        if result.update.get("@type") == "error":
+            raise ValueError(
+                f"TDLib error for messages {msg_ids}: "
+                f"{result.update.get('message', 'unknown')}"
+            )
+        msgs = result.update.get("messages") or []
+        if len(msgs) != len(msg_ids):
+            raise ValueError(
+                f"Expected {len(msg_ids)} results from forwardMessages, got {len(msgs)}"
+            )
+        return msgs
+
+    def _on_flood(self, dst: int, limiter: AdaptiveRateLimiter, wait: int, count: int):
+        """Slow *dst*'s limiter down for a FloodWait of *wait* seconds on *count* messages."""
+        metrics.flood_waits.inc()
+        metrics.flood_wait_seconds.inc(wait)
+        # Cap the sleep to avoid freezing the process for hours when
+        # the server reports an extreme FloodWait (e.g. 86400 s).
+        if wait > MAX_FLOOD_WAIT:
+            log.warning(
+                "Server requested FloodWait of %ds for %d message(s) — "
+                "capping sleep to %ds.",
+                wait, count, MAX_FLOOD_WAIT,
+            )
+            wait = MAX_FLOOD_WAIT
+        else:
+            log.warning(
+                "FloodWait %ds for %d message(s) – sleeping…",
+                wait, count,
+            )
+        limiter.on_flood(wait)  # the next reservation waits it out
+        metrics.send_rate.set(limiter.rate, chat=dst)
+        self._rates_dirty = True
+        log.info("Send rate to chat %d lowered to %.2f req/s.", dst, limiter.rate)
+
+    def _request(self, dst: int, method: str, params: dict):
+        """Call *method* for chat *dst*, paced by its rate limiter; FloodWaits are waited out."""
+        limiter = self._limiter(dst)
+        while True:
+            limiter.acquire()
             try:
-                result = self.tg.call_method("forwardMessages", data, block=True)
-                if result.update is None:
-                    raise ValueError(f"No response from TDLib for message {msg_id}")
-                if result.update.get("@type") == "error":
-                    raise ValueError(
-                        f"TDLib error for message {msg_id}: "
-                        f"{result.update.get('message', 'unknown')}"
-                    )
-                msgs = result.update.get("messages", [None])
-                if not msgs or msgs[0] is None:
-                    raise ValueError(f"Null response for message {msg_id}")
-                return msgs[0]["id"]
+                result = self.tg.call_method(method, params, block=True)
+                limiter.on_success()
+                return result
             except Exception as e:
-                flood = re.search(
-                    r'(?:FLOOD_WAIT|flood_wait)_(\d+)', str(e), re.IGNORECASE
-                )
-                if flood:
-                    wait = int(flood.group(1))
-                    # Cap the sleep to avoid freezing the process for hours when
-                    # the server reports an extreme FloodWait (e.g. 86400 s).
-                    if wait > MAX_FLOOD_WAIT:
-                        log.warning(
-                            "Server requested FloodWait of %ds for message %d — "
-                            "capping sleep to %ds.",
-                            wait, msg_id, MAX_FLOOD_WAIT,
-                        )
-                        wait = MAX_FLOOD_WAIT
-                    else:
-                        log.warning(
-                            "FloodWait %ds for message %d – sleeping…",
-                            wait, msg_id,
-                        )
-                    time.sleep(wait)
-                    # FloodWait is a server throttle, not a real failure;
-                    # do not count it against the attempt budget.
-                else:
-                    attempt += 1
-                    if attempt >= MAX_COPY_ATTEMPTS:
-                        break
-                    wait = 2 ** attempt
-                    log.warning(
-                        "Error on attempt %d/%d for message %d: %s (retrying in %ds)",
-                        attempt, MAX_COPY_ATTEMPTS, msg_id, e, wait,
-                    )
-                    time.sleep(wait)
-        log.error("Failed to copy message %d after %d attempts.", msg_id, MAX_COPY_ATTEMPTS)
-        return None
+                wait = flood_wait(e)
+                if wait is None:
+                    raise
+                self._on_flood(dst, limiter, wait, 1)
 
-    # ── Date helpers ────────────────────────────────────────────────────────
+    def _mirror(self, action: str, route: tuple, src_ids: tuple):
+        """Apply the edit (``"edit"``) or deletion (``"delete"``) of *src_ids* to their copies."""
+        src, dst = route
+        with self._copy_lock:
+            copies = self.copy_maps.get(src, dst)
+            dst_ids = [copies[mid] for mid in src_ids if mid in copies]
+        if not dst_ids:
+            return
+        if any(mid & TEMP_ID_MASK for mid in dst_ids):
+            raise ValueError("copy not sent yet")
+        if action == "delete":
+            # One call per batch, however many messages the source deleted at once.
+            for i in range(0, len(dst_ids), FORWARD_BATCH):
+                self._request(dst, "deleteMessages", {
+                    "chat_id": dst, "message_ids": dst_ids[i:i + FORWARD_BATCH], "revoke": True,
+                })
+            log.info("Deleted %d copied message(s) in chat %d.", len(dst_ids), dst)
+            return
+        # Edits send the source's current content, so a late retry never
+        # overwrites a newer edit.
+        message = self.tg.call_method(
+            "getMessage", {"chat_id": src, "message_id": src_ids[0]}, block=True,
+        ).update
+        content = message["content"]
+        if content["@type"] == "messageText":
+            method = "editMessageText"
+            params = {"input_message_content": {"@type": "inputMessageText",
+                                                "text": content["text"]}}
+        elif "caption" in content:
+            method, params = "editMessageCaption", {"caption": content["caption"]}
+        else:
+            return  # nothing a copy can be edited to match
+        params.update(chat_id=dst, message_id=dst_ids[0])
+        try:
+            self._request(dst, method, params)
+        except Exception as e:
+            if "MESSAGE_NOT_MODIFIED" not in str(e):
+                raise
+        log.info("Edited copy %d:%d of %d:%d.", dst, dst_ids[0], src, src_ids[0])
+
+    def copy_messages(self, src: int, dst: int, msg_ids: list):
+        """Forward *msg_ids* (oldest first) in batches of up to FORWARD_BATCH.
+
+        Returns ``(copied, failed)``: a ``{source ID: destination ID}`` dict for
+        every message that was copied and a ``{source ID: error}`` dict for the
+        rest, leaving out messages deleted from the source (see :meth:`_gone`).
+        When TDLib returns ``None`` for some of a batch's messages, or
+        rejects the batch with an error that may be down to one message, only
+        the failed IDs are retried, split in half each time so a single poison
+        message is isolated in O(log n) calls (see :meth:`_settle_batch`).
+        No back-off happens here — callers park failures in a RetryScheduler.
+        Raises DestinationError if the destination rejects every message.
+        """
+        copied: dict[int, int] = {}
+        failed: dict[int, str] = {}
+        for start in range(0, len(msg_ids), FORWARD_BATCH):
+            self._copy_batch(src, dst, msg_ids[start:start + FORWARD_BATCH], copied, failed)
+        return copied, failed
+
+    def _copy_batch(self, src: int, dst: int, msg_ids: list, copied: dict, failed: dict,
+                    verify: bool = True):
+        try:
+            outcome = self._forward(src, dst, msg_ids)
+        except Exception as e:
+            outcome = e
+        suspects = self._suspects(msg_ids, outcome) if verify else []
+        gone = self._gone(src, suspects) if suspects else set()
+        for part in self._settle_batch(msg_ids, outcome, copied, failed, gone):
+            self._copy_batch(src, dst, part, copied, failed, verify=False)
+
+    @staticmethod
+    def _suspects(msg_ids: list, outcome) -> list:
+        """Return the IDs in *msg_ids* that the *outcome* of forwarding them suggests were deleted."""
+        if isinstance(outcome, Exception):
+            return list(msg_ids) if MISSING_ERROR_RE.search(str(outcome)) else []
+        return [mid for mid, m in zip(msg_ids, outcome) if m is None]
+
+    def _gone(self, src: int, msg_ids: list) -> set:
+        """Return the IDs in *msg_ids* that chat *src* no longer has, asking TDLib with one getMessages call.
+
+        The message index can serve messages that were deleted while nobody
+        was watching; forwarding one fails, and without this check it would
+        be split out in O(log n) calls and dead-lettered.
+        """
+        try:
+            result = self.tg.call_method(
+                "getMessages", {"chat_id": src, "message_ids": msg_ids}, block=True,
+            )
+        except Exception as e:
+            log.warning("getMessages failed for chat %d: %s", src, e)
+            return set()
+        return self._missing(src, msg_ids, result)
+
+    def _missing(self, src: int, msg_ids: list, result) -> set:
+        """Return the IDs a getMessages *result* for *msg_ids* has no message for, dropping them from the index."""
+        if result.update is None or result.update.get("@type") != "messages":
+            return set()
+        found = result.update.get("messages") or []
+        if len(found) != len(msg_ids):
+            return set()
+        gone = {mid for mid, m in zip(msg_ids, found) if m is None}
+        if gone:
+            self.index.delete(src, sorted(gone))
+            metrics.messages_deleted.inc(len(gone))
+            log.info("Skipping %d message(s) deleted from chat %d.", len(gone), src)
+        return gone
 
     @staticmethod
-    def _parse_date_utc(date_str: str, end_of_day: bool = False):
-        """Parse 'YYYY-MM-DD' as midnight UTC (or 23:59:59 when *end_of_day* is True).
+    def _settle_batch(msg_ids: list, outcome, copied: dict, failed: dict,
+                      gone: set = frozenset()) -> list:
+        """Record the *outcome* of forwarding *msg_ids*; return the batches to send again.
 
-        Returns None for an empty string.
+        *outcome* is the batch's ``messages`` list or the exception it raised.
+        Copies go into *copied* and final failures into *failed*; the IDs
+        still to retry come back split in half.  Only messages TDLib returned
+        ``None`` for, or a batch error that may be down to one of its
+        messages, are split.  A transient error fails the whole batch (for
+        the caller to retry later), and an error about the destination chat
+        raises DestinationError, as no other batch can succeed either.
+        IDs in *gone* were deleted from the source: they are dropped, and
+        the rest of a batch that failed because of them is sent again whole.
+        Shared by the threaded and async copy paths, which differ only in
+        how they send a batch.
         """
-        if not date_str:
+        if isinstance(outcome, Exception):
+            error = str(outcome)
+            if DESTINATION_ERROR_RE.search(error):
+                raise DestinationError(error) from outcome
+            if gone:
+                rest = [mid for mid in msg_ids if mid not in gone]
+                return [rest] if rest else []
+            if len(msg_ids) == 1 or TRANSIENT_ERROR_RE.search(error):
+                failed.update(dict.fromkeys(msg_ids, error))
+                return []
+            log.warning("Batch of %d messages failed: %s — splitting.", len(msg_ids), outcome)
+            rejected = msg_ids
+        else:
+            rejected = []
+            for mid, m in zip(msg_ids, outcome):
+                if m is not None:
+                    copied[mid] = m["id"]
+                elif mid not in gone:
+                    rejected.append(mid)
+            if not rejected:
+                return []
+            if len(msg_ids) == 1:
+                failed[msg_ids[0]] = "message was not forwarded"
+                return []
+            log.warning(
+                "%d of %d messages in batch were not forwarded — retrying them.",
+                len(rejected), len(msg_ids),
+            )
+        half = len(rejected) // 2
+        return [part for part in (rejected[:half], rejected[half:]) if part]
+
+    # ── Date helpers ────────────────────────────────────────────────────────
+
+    def _prompt_date_range(self, from_date: str = None, to_date: str = None):
+        """Return ``(from_ts, to_ts)`` for the given dates, prompting for any not given.
+
+        Either bound is None when left blank.  Returns None (after logging
+        why) if a date is malformed.
+        """
+        if from_date is None:
+            from_date = input("Start date (YYYY-MM-DD) [blank = from beginning]: ").strip()
+        if to_date is None:
+            to_date = input("End date (YYYY-MM-DD)   [blank = until latest]:    ").strip()
+        try:
+            return (parse_date(from_date),
+                    parse_date(to_date, end_of_day=True))
+        except ValueError:
+            log.error(
+                "Invalid date format. Please use YYYY-MM-DD (e.g. 2024-01-31)."
+            )
             return None
-        ts = int(
-            datetime.strptime(date_str, "%Y-%m-%d")
-            .replace(tzinfo=timezone.utc)
-            .timestamp()
-        )
-        if end_of_day:
-            ts += 86399  # advance to 23:59:59 of the same day
-        return ts
 
     # ── Copy operations ─────────────────────────────────────────────────────
 
-    def full_copy(self):
-        """Copy every historical message from source to destination."""
-        src, dst = self._validate_chats()
-        if src is None:
+    def full_copy(self, verify: bool = None):
+        """Copy every historical message of each routed source to its destinations.
+
+        A source's history is fetched once and forwarded to all of its
+        destinations concurrently.  Each pair resumes after its own
+        checkpoint, so only messages newer than the last fully-copied one are
+        sent.  *verify* rescans the whole history from Telegram instead (still
+        skipping anything already in the copy map, and bringing the message
+        index up to date); when None and a checkpoint exists,
+        the user is asked.
+        """
+        routes = self._routes()
+        if not routes:
             return
 
-        log.info("Fetching message list from source chat %d…", src)
-        ids = [
-            m["id"] for m in self._iter_messages(src)
-            if m.get("content", {}).get("@type") not in EXCLUDE_TYPES
-        ]
-        ids.reverse()  # oldest → newest
+        if verify is None and any(
+            self.checkpoints.get(self._pair_key(*p)) for p in self._route_pairs(routes)
+        ):
+            answer = input(
+                "Resume from the last checkpoint? [Y/n, n = rescan full history to verify]: "
+            ).strip().lower()
+            verify = answer in ("n", "no")
 
-        log.info("Found %d messages to process.", len(ids))
+        total = 0
+        for src, dsts in routes.items():
+            targets = {
+                dst: 0 if verify else self.checkpoints.get(self._pair_key(src, dst), 0)
+                for dst in dsts
+            }
+            after_id = min(targets.values())
+            if after_id:
+                log.info("Copying messages of chat %d newer than checkpoint %d to %s…",
+                         src, after_id, ", ".join(map(str, dsts)))
+            else:
+                log.info("Copying history of chat %d to %s (oldest → newest)…",
+                         src, ", ".join(map(str, dsts)))
+            with tracing.span("full_copy", src=src, dsts=list(dsts), after=after_id) as job:
+                counts = self.engine.run(self.engine.copy_history(src, targets, rescan=verify))
+                job.set(copied=counts)
+            total += sum(counts.values())
 
-        count = 0
-        for mid in tqdm(ids, desc="Copying", unit="msg"):
-            if mid in self.copied:
-                continue
-            new_id = self.copy_message(src, dst, mid)
-            if new_id:
-                self._record_copy(mid, new_id)
-                count += 1
+        self.save_copy_map()
+        log.info("✅ Full copy complete — %d messages copied.", total)
+
+    def date_copy(self, from_date: str = None, to_date: str = None):
+        """Copy messages within a date range, prompting for any bound not given.
+
+        Dates are 'YYYY-MM-DD' (UTC); an empty string leaves that end open.
+        Each routed source is read once and copied to all its destinations.
+        """
+        routes = self._routes()
+        if not routes:
+            return
+
+        dates = self._prompt_date_range(from_date, to_date)
+        if dates is None:
+            return
+        from_ts, to_ts = dates
+
+        total = 0
+        for src, dsts in routes.items():
+            log.info("Copying messages of chat %d in date range to %s…",
+                     src, ", ".join(map(str, dsts)))
+            with tracing.span("date_copy", src=src, dsts=list(dsts)) as job:
+                counts = self.engine.run(self.engine.copy_range(src, dsts, from_ts, to_ts))
+                job.set(copied=counts)
+            total += sum(counts.values())
 
         self.save_copy_map()
-        log.info("✅ Full copy complete — %d messages copied.", count)
+        log.info("✅ Date-range copy complete — %d messages copied.", total)
 
-    def date_copy(self):
-        """Copy messages within a user-specified date range."""
-        src, dst = self._validate_chats()
-        if src is None:
+    def filtered_copy(self, kind: str = None, query: str = None,
+                      from_date: str = None, to_date: str = None):
+        """Copy only the messages of one content type and/or matching a text query.
+
+        *kind* is a key of SEARCH_FILTERS (blank = any type).  Telegram does
+        the filtering server-side, so only matching messages are fetched.
+        Any argument not given is prompted for; dates work as in :meth:`date_copy`.
+        """
+        routes = self._routes()
+        if not routes:
+            return
+
+        if kind is None:
+            kind = input(f"Content type ({'/'.join(SEARCH_FILTERS)}) [blank = any]: ")
+        kind = kind.strip().lower()
+        if kind and kind not in SEARCH_FILTERS:
+            log.error("Unknown content type '%s' — choose one of: %s.",
+                      kind, ", ".join(SEARCH_FILTERS))
             return
+        if query is None:
+            query = input("Text to search for [blank = none]: ")
+        query = query.strip()
+        if not kind and not query:
+            log.error("Give a content type, a search text or both.")
+            return
+        dates = self._prompt_date_range(from_date, to_date)
+        if dates is None:
+            return
+        from_ts, to_ts = dates
 
-        from_date = input("Start date (YYYY-MM-DD) [blank = from beginning]: ").strip()
-        to_date   = input("End date (YYYY-MM-DD)   [blank = until latest]:    ").strip()
+        total = 0
+        for src, dsts in routes.items():
+            log.info("Copying %s messages%s of chat %d to %s…", kind or "all",
+                     f" matching '{query}'" if query else "", src, ", ".join(map(str, dsts)))
+            with tracing.span("filtered_copy", src=src, dsts=list(dsts), kind=kind) as job:
+                counts = self.engine.run(self.engine.copy_search(
+                    src, dsts, SEARCH_FILTERS.get(kind), query, from_ts, to_ts,
+                ))
+                job.set(copied=counts)
+            total += sum(counts.values())
+
+        self.save_copy_map()
+        log.info("✅ Filtered copy complete — %d messages copied.", total)
+
+    def export_chats(self, chat_ids: str = None):
+        """Export chats to local archives under data/archive/, appending to earlier exports.
+
+        *chat_ids* is a comma-separated list; blank exports every routed
+        source.  Prompted for when not given.
+        """
+        if chat_ids is None:
+            chat_ids = input("Chat ID(s) to export, comma-separated [blank = routed sources]: ")
         try:
-            from_ts = self._parse_date_utc(from_date)
-            to_ts   = self._parse_date_utc(to_date, end_of_day=True)
+            chats = [int(c) for c in chat_ids.split(",") if c.strip()]
         except ValueError:
-            log.error(
-                "Invalid date format. Please use YYYY-MM-DD (e.g. 2024-01-31)."
-            )
+            log.error("Chat IDs must be integers.")
             return
+        if not chats:
+            chats = list(self._routes())
+            if not chats:
+                return
 
-        log.info("Fetching messages in date range…")
-        filtered = []
-        for m in self._iter_messages(src):
-            msg_date = m["date"]
-            # _iter_messages yields newest-to-oldest; once we go past from_ts
-            # all subsequent messages will be even older — stop early.
-            if from_ts is not None and msg_date < from_ts:
-                break
-            if m.get("content", {}).get("@type") in EXCLUDE_TYPES:
-                continue
-            if to_ts is not None and msg_date > to_ts:
-                continue
-            filtered.append(m)
-        filtered.reverse()  # oldest → newest
+        total = 0
+        for chat_id in chats:
+            archive = ChatArchive.for_chat(chat_id)
+            if archive.last_id:
+                log.info("Exporting messages of chat %d newer than %d to %s…",
+                         chat_id, archive.last_id, archive.directory)
+            else:
+                log.info("Exporting chat %d to %s…", chat_id, archive.directory)
+            with tracing.span("export", chat=chat_id, after=archive.last_id) as job:
+                count = self.engine.run(self.engine.export_history(chat_id, archive))
+                job.set(exported=count)
+            log.info("Chat %d: %d new message(s), %d archived in %d chunk(s).",
+                     chat_id, count, len(archive), len(archive.chunks))
+            total += count
+        log.info("✅ Export complete — %d messages written.", total)
 
-        log.info("Found %d messages in the specified date range.", len(filtered))
+    def replay_dead_letters(self):
+        """Retry every dead-lettered message; those that fail again are re-queued.
 
+        A pair's entries leave the queue only once its replay has finished
+        (and the copies are saved), so an interrupted replay loses nothing;
+        messages it already copied are skipped next time via the copy map.
+        """
+        entries = self.dead_letters.load()
+        if not entries:
+            log.info("No dead-lettered messages.")
+            return
+        pairs: dict[tuple, list] = {}
+        for e in entries:
+            pairs.setdefault((e["src"], e["dst"]), []).append(e)
         count = 0
-        for msg in tqdm(filtered, desc="Copying", unit="msg"):
-            mid = msg["id"]
-            if mid in self.copied:
+        for (src, dst), pair_entries in pairs.items():
+            ids = {e["id"] for e in pair_entries}
+            log.info("Replaying %d dead-lettered message(s) from %d to %d…", len(ids), src, dst)
+            try:
+                count += self.engine.run(self.engine.copy_ids(src, dst, ids))
+            except DestinationError as e:
+                log.error("Cannot copy to chat %d: %s — its messages stay queued.", dst, e)
                 continue
-            new_id = self.copy_message(src, dst, mid)
-            if new_id:
-                self._record_copy(mid, new_id)
-                count += 1
+            finally:
+                self.save_copy_map()
+            # Messages that failed again were re-added as new entries.
+            self.dead_letters.remove(pair_entries)
+        log.info("✅ Dead-letter replay complete — %d of %d messages copied.", count, len(entries))
 
-        self.save_copy_map()
-        log.info("✅ Date-range copy complete — %d messages copied.", count)
+    @staticmethod
+    def _load_live_state() -> dict:
+        try:
+            with open(LIVE_STATE_PATH) as f:
+                return {int(k): v for k, v in json.load(f).items()}
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            return {}
 
     def start_live_monitoring(self):
-        """Forward new messages from source to destination in real time."""
-        src, dst = self._validate_chats()
-        if src is None:
+        """Forward new messages of every routed source to its destinations in real time.
+
+        Edits and deletions of copied messages are mirrored to the copies
+        (MIRROR_EDITS / MIRROR_DELETES).  Live mode remembers, per source,
+        the ID up to which every message has been handled.  On start, and whenever the connection comes back,
+        it pages history forward from there, so messages posted while it was
+        stopped or offline are forwarded too; the copy map and ``pending``
+        keep them from being sent twice.
+        """
+        routes = self._routes()
+        if not routes:
             return
 
-        pending: set[int] = set()  # message IDs currently being forwarded
+        pending: set[tuple] = set()  # (route, message ID) queued or being forwarded
+        claimed: set[tuple] = set()  # (dst, fingerprint) on its way (CONTENT_DEDUP)
+        seen = self._load_live_state()  # source → newest message ID dispatched
 
-        def handle_update(update):
-            if update.get("@type") != "updateNewMessage":
-                return
-            message = update["message"]
-            if message["chat_id"] != src:
+        def forward(route, messages):
+            # Failed messages stay in `pending` while their retry is parked.
+            src, dst = route
+            failed: dict[int, str] = {}
+            for chunk in album_chunks(messages):
+                try:
+                    copied, chunk_failed = self.copy_messages(src, dst, [m["id"] for m in chunk])
+                except DestinationError as e:
+                    # Retried later, in case access to the chat comes back.
+                    copied, chunk_failed = {}, {m["id"]: str(e) for m in chunk}
+                failed.update(chunk_failed)
+                for mid, new_id in copied.items():
+                    self._record_copy(src, dst, mid, new_id)
+                    log.info("Live copied %d:%d → %d:%d", src, mid, dst, new_id)
+                self._copied_content(dst, [m for m in chunk if m["id"] in copied])
+                with self._copy_lock:
+                    # Copied, or deleted from the source: either way, done with.
+                    for m in chunk:
+                        if m["id"] not in chunk_failed:
+                            pending.discard((route, m["id"]))
+                            if m["id"] not in copied:
+                                self._unclaim(dst, m, claimed)
+            return failed
+
+        def dead(route, message, error):
+            self.dead_letters.add(route[0], route[1], message["id"], error)
+            with self._copy_lock:
+                pending.discard((route, message["id"]))
+                self._unclaim(route[1], message, claimed)
+
+        # By default every destination gets a worker of its own.
+        destinations = len({dst for dsts in routes.values() for dst in dsts})
+        try:
+            workers = int(os.getenv("LIVE_WORKERS") or destinations)
+        except ValueError:
+            log.warning("LIVE_WORKERS must be an integer — using one per destination.")
+            workers = destinations
+        try:
+            album_window = float(os.getenv("ALBUM_WINDOW", "1.0"))
+        except ValueError:
+            log.warning("ALBUM_WINDOW must be a number of seconds — using 1.0.")
+            album_window = 1.0
+        pool = LiveWorkerPool(forward, dead, workers, album_window)
+        mirror = MirrorWorker(self._mirror)
+        # Forwarded (not copied) messages cannot be edited by their sender.
+        mirror_edits = os.getenv("MIRROR_EDITS", "true").lower() == "true" \
+            and os.getenv("SEND_COPY", "true").lower() == "true"
+        mirror_deletes = os.getenv("MIRROR_DELETES", "true").lower() == "true"
+        recover_from = dict(seen)
+        for pair in self._route_pairs(routes):
+            self._copy_map(*pair)  # load now rather than on the update thread
+
+        # Route, filter, dedup and enqueue only: runs on python-telegram's update thread.
+        def dispatch(message):
+            src = message["chat_id"]
+            dsts = routes.get(src)
+            if dsts is None:
                 return
+            self.index.add_message(message)
+            mid = message["id"]
+            with self._copy_lock:
+                seen[src] = max(seen.get(src, 0), mid)
             if message.get("content", {}).get("@type") in EXCLUDE_TYPES:
                 return
-            mid = message["id"]
+            todo = []
             with self._copy_lock:
-                if mid in self.copied or mid in pending:
+                for dst in dsts:
+                    route = (src, dst)
+                    if (route, mid) in pending or mid in self.copy_maps.get(src, dst):
+                        continue
+                    if not self._unique(dst, [message], claimed):
+                        continue
+                    pending.add((route, mid))
+                    todo.append(route)
+            if not todo:
+                return
+            metrics.live_updates.inc()
+            for route in todo:
+                pool.submit(route, message)
+
+        def handle_update(update):
+            dispatch(update["message"])
+
+        def handled_upto() -> dict:
+            # A message still queued or awaiting a retry must be fetched again
+            # after a crash, so its source's recovery point stays below it.
+            with self._copy_lock:
+                points = dict(seen)
+                for (src, _), mid in pending:
+                    points[src] = min(points.get(src, mid), mid - 1)
+            return points
+
+        catching_up = threading.Lock()
+
+        def catch_up(points: dict):
+            # *points* is taken before newer live messages can move `seen` on.
+            async def one(src):
+                after = points.get(src)
+                if after is None:
+                    # First run for this source: start from its newest message.
+                    result = await aio.wait(self.tg.get_chat_history(src, limit=1))
+                    latest = (result.update or {}).get("messages")
+                    if latest:
+                        with self._copy_lock:
+                            seen.setdefault(src, latest[0]["id"])
                     return
-                pending.add(mid)
-            try:
-                new_id = self.copy_message(src, dst, mid)
-                if new_id:
-                    self._record_copy(mid, new_id)
-                    log.info("Live copied %d → %d", mid, new_id)
-            finally:
-                with self._copy_lock:
-                    pending.discard(mid)
+                count = 0
+                async for page in self.engine.pages_forward(src, after):
+                    for m in page:
+                        dispatch(m)
+                    count += len(page)
+                if count:
+                    log.info("Caught up on %d message(s) in chat %d posted since message %d.",
+                             count, src, after)
+
+            async def run():
+                await asyncio.gather(*(one(src) for src in routes))
+
+            with catching_up, tracing.span("live_catch_up", chats=len(routes)):
+                self.engine.run(run())
+
+        connected = [True]
+
+        def handle_connection_state(update):
+            ready = update["state"]["@type"] == "connectionStateReady"
+            if ready and not connected[0]:
+                log.info("Connection restored — catching up on missed messages…")
+                threading.Thread(target=catch_up, args=(handled_upto(),),
+                                 name="telecopy-catch-up", daemon=True).start()
+            connected[0] = ready
+
+        def copied(src, ids) -> dict:
+            # Routes on which any of *ids* has been copied → those IDs.
+            found = {}
+            with self._copy_lock:
+                for dst in routes[src]:
+                    copies = self.copy_maps.get(src, dst)
+                    hits = [mid for mid in ids if mid in copies]
+                    if hits:
+                        found[(src, dst)] = hits
+            return found
+
+        def handle_delete(update):
+            src = update["chat_id"]
+            # from_cache deletions only evict TDLib's local cache.
+            if src not in routes or not update.get("is_permanent") or update.get("from_cache"):
+                return
+            self.index.delete(src, update["message_ids"])
+            if mirror_deletes:
+                for route, ids in copied(src, update["message_ids"]).items():
+                    mirror.submit("delete", route, ids)
+
+        def handle_edit(update):
+            src = update["chat_id"]
+            if src in routes and mirror_edits:
+                for route, ids in copied(src, [update["message_id"]]).items():
+                    mirror.submit("edit", route, ids)
 
         self.monitoring = True
-        self.tg.add_update_handler(handle_update)
-        log.info("📡 Live monitoring started. Press Ctrl+C to stop.")
+        pool.start()
+        mirror.start()
+        handlers = (("updateNewMessage", handle_update),
+                    ("updateDeleteMessages", handle_delete),
+                    ("updateMessageContent", handle_edit),
+                    ("updateConnectionState", handle_connection_state))
+        for kind, handler in handlers:
+            self.tg.add_update_handler(kind, handler)
+        log.info(
+            "📡 Live monitoring %d source chat(s) with %d worker(s). Press Ctrl+C to stop.",
+            len(routes), workers,
+        )
+        next_stats = time.monotonic() + LIVE_STATS_EVERY
+        saved = {}
         try:
+            # Handlers are registered first, so nothing falls between the
+            # catch-up and the live stream; overlaps are deduplicated.
+            catch_up(recover_from)
             while self.monitoring:
                 time.sleep(1)
+                points = handled_upto()
+                if points != saved:
+                    write_json_atomic(LIVE_STATE_PATH, points)
+                    saved = points
+                depth, lag = pool.stats()
+                metrics.live_queue_depth.set(depth)
+                metrics.live_lag.set(round(lag, 3))
+                if time.monotonic() >= next_stats:
+                    next_stats += LIVE_STATS_EVERY
+                    if depth or lag:
+                        log.info("Live queue: %d message(s) waiting, lag %.1fs.", depth, lag)
         except KeyboardInterrupt:
             pass
         finally:
             self.monitoring = False
-            try:
-                self.tg.remove_update_handler(handle_update)
-            except Exception:
-                pass
+            for kind, handler in handlers:
+                try:
+                    self.tg.remove_update_handler(kind, handler)
+                except Exception:
+                    pass
+            pool.stop()
+            mirror.stop()
+            write_json_atomic(LIVE_STATE_PATH, handled_upto())
             log.info("Live monitoring stopped.")
 
     # ── Settings ────────────────────────────────────────────────────────────
@@ -535,14 +2251,14 @@ class TeleCopy:
         print("\nAdvanced Settings:")
         print("  1. Clear copy history")
         print("  2. Reset session data")
+        print(f"  3. Replay failed messages ({len(self.dead_letters.load())} queued)")
         print("  0. Back")
         choice = input("Select: ").strip()
         if choice == "1":
-            try:
-                os.remove(COPY_MAP_PATH)
-                self.copied.clear()
+            if self.copy_maps.exists():
+                self._clear_copy_map()
                 log.info("✅ Copy history cleared.")
-            except FileNotFoundError:
+            else:
                 log.info("No copy history found.")
         elif choice == "2":
             if self.tg:
@@ -550,22 +2266,98 @@ class TeleCopy:
                     self.tg.stop()
                 except Exception:
                     pass
+            self._clear_copy_map()
+            self.index.close()
+            self.chats.clear()
+            if self.dedup:
+                self.dedup.close()
             for d in ("tdlib-session", "data"):
                 try:
                     shutil.rmtree(d)
                     log.info("Removed %s/", d)
                 except FileNotFoundError:
                     pass
-            self.copied.clear()
-            self._pending_saves = 0
             self.tg = None
             self.session_active = False
             log.info("✅ Session data reset. Please reconnect (option 0).")
+        elif choice == "3":
+            if not self.session_active:
+                print("Please connect to Telegram first (option 0).")
+            else:
+                self.replay_dead_letters()
+
+    # ── Headless runs ───────────────────────────────────────────────────────
+
+    def sync(self, mode: str, routes: dict = None, since: str = "", until: str = "") -> int:
+        """Run one copy job without prompts, print a JSON summary to stdout and return the exit code.
+
+        *mode* is one of SYNC_MODES: ``incremental`` resumes each pair after
+        its checkpoint, ``full`` rescans the whole history, ``date`` copies
+        *since*..*until* (as in :meth:`date_copy`) and ``live`` forwards new
+        messages until interrupted (Ctrl+C or SIGTERM).  *routes* replaces
+        the routes in .env for this run.  The session must already be logged
+        in; there is no way to enter a login code here.
+        """
+        started = time.monotonic()
+        counters = (metrics.messages_copied, metrics.messages_dead, metrics.messages_deduplicated,
+                    metrics.messages_deleted, metrics.copy_jobs_failed)
+        before = [c.value() for c in counters]
+        if routes is not None:
+            self.route_override = routes
+
+        status, code = "ok", EXIT_OK
+        try:
+            routes = self._routes()
+            if not routes:
+                status, code = "no_routes", EXIT_USAGE
+            else:
+                self.handle_connection(interactive=False)
+                if mode == "live":
+                    self.start_live_monitoring()
+                elif mode == "date":
+                    self.date_copy(since, until)
+                else:
+                    self.full_copy(verify=mode == "full")
+        except ValueError as e:
+            log.error("Cannot start: %s.", e)
+            status, code = "config_error", EXIT_USAGE
+        except KeyboardInterrupt:
+            log.warning("Interrupted — progress so far is saved.")
+            status, code = "interrupted", EXIT_INTERRUPTED
+        except Exception as e:
+            log.exception("Sync failed: %s", e)
+            status, code = "error", EXIT_ERROR
+        finally:
+            self.monitoring = False
+            if self.session_active:
+                self._wait_for_sends()
+            self.save_copy_map()
+            if self.tg:
+                try:
+                    self.tg.stop()
+                except Exception:
+                    pass
+
+        copied, failed, deduplicated, deleted, aborted = (
+            int(c.value() - b) for c, b in zip(counters, before))
+        if aborted and code == EXIT_OK:
+            status, code = "error", EXIT_ERROR  # a destination could not be copied to
+        elif failed and code == EXIT_OK:
+            status, code = "incomplete", EXIT_INCOMPLETE
+        print(json.dumps({
+            "command": "sync", "mode": mode, "routes": format_routes(routes or {}),
+            "status": status, "exit_code": code, "copied": copied, "failed": failed,
+            "deduplicated": deduplicated, "deleted": deleted,
+            "seconds": round(time.monotonic() - started, 3),
+        }), flush=True)
+        return code
 
     # ── Graceful shutdown ───────────────────────────────────────────────────
 
     def clean_exit(self):
         self.monitoring = False
+        if self.session_active:
+            self._wait_for_sends()  # the copy map is saved at exit
         if self.tg:
             try:
                 self.tg.stop()
@@ -581,23 +2373,25 @@ class TeleCopy:
             print("""
 ========= TeleCopy =========
 0. Connect to Telegram
-1. Set source and destination
+1. Set up routes (source → destinations)
 2. Copy full history
 3. Live monitoring (auto-forward)
 4. Copy by date range
-5. Update API credentials
-6. Advanced settings
-7. Exit
+5. Copy by content type / text search
+6. Export to local archive
+7. Update API credentials
+8. Advanced settings
+9. Exit
 """)
             choice = input("Choose an option: ").strip()
 
             if choice == "0":
                 self.handle_connection()
-            elif choice == "5":
+            elif choice == "7":
                 self.update_config()
-            elif choice == "6":
+            elif choice == "8":
                 self.advanced_menu()
-            elif choice == "7":
+            elif choice == "9":
                 self.clean_exit()
             elif not self.session_active:
                 print("Please connect to Telegram first (option 0).")
@@ -609,13 +2403,86 @@ class TeleCopy:
                 self.start_live_monitoring()
             elif choice == "4":
                 self.date_copy()
+            elif choice == "5":
+                self.filtered_copy()
+            elif choice == "6":
+                self.export_chats()
             else:
                 print("Invalid choice.")
 
 
-if __name__ == "__main__":
-    tc = TeleCopy()
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _attach_pair_values(argv: list) -> list:
+    """Rewrite ``--pair VALUE`` as ``--pair=VALUE``.
+
+    Group and channel IDs are negative, and argparse would otherwise take
+    a value like ``-1001:-1002`` for an option.
+    """
+    out = []
+    for arg in argv:
+        if out and out[-1] == "--pair" and not arg.startswith("--"):
+            out[-1] = f"--pair={arg}"
+        else:
+            out.append(arg)
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="telecopy",
+        description="Copy Telegram messages between chats. Without a command, "
+                    "opens the interactive menu.",
+    )
+    commands = parser.add_subparsers(dest="command")
+    sync = commands.add_parser(
+        "sync", help="copy without prompts and print a JSON summary",
+        description="Copy without prompts (for cron, systemd, CI) and print a JSON "
+                    "summary. Exit codes: 0 ok, 1 some messages failed, 2 bad usage or "
+                    "configuration, 3 error, 130 interrupted. The Telegram session "
+                    "must have been logged in once from the interactive menu.",
+    )
+    sync.add_argument("--pair", action="append", metavar="SRC:DST[,DST...]",
+                      help="route to copy, repeatable (default: the routes in .env)")
+    sync.add_argument("--mode", choices=SYNC_MODES,
+                      help="incremental: resume after each pair's checkpoint (default); "
+                           "full: rescan the whole history; date: copy --since..--until; "
+                           "live: forward new messages until stopped")
+    sync.add_argument("--since", default="", metavar="YYYY-MM-DD",
+                      help="first day to copy, UTC (implies --mode date)")
+    sync.add_argument("--until", default="", metavar="YYYY-MM-DD",
+                      help="last day to copy, UTC (implies --mode date)")
+    args = parser.parse_args(_attach_pair_values(sys.argv[1:] if argv is None else argv))
+
+    if args.command is None:
+        setup_logging()
+        tc = TeleCopy()
+        try:
+            tc.show_menu()
+        except KeyboardInterrupt:
+            tc.clean_exit()
+        return EXIT_OK
+
+    mode = args.mode or ("date" if args.since or args.until else "incremental")
+    if (args.since or args.until) and mode != "date":
+        parser.error("--since/--until only apply to --mode date")
     try:
-        tc.show_menu()
-    except KeyboardInterrupt:
-        tc.clean_exit()
+        parse_date(args.since)
+        parse_date(args.until)
+    except ValueError:
+        parser.error("dates must be YYYY-MM-DD")
+    try:
+        routes = parse_routes(";".join(args.pair)) if args.pair else None
+    except ValueError as e:
+        parser.error(f"invalid --pair: {e}")
+
+    setup_logging()
+    # Let `kill`/systemd stop a run the way Ctrl+C does, so progress is saved.
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    return TeleCopy().sync(mode, routes, args.since, args.until)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
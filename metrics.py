@@ -0,0 +1,262 @@
+"""Process-wide counters, gauges and latency histograms for TeleCopy jobs.
+
+Metrics are always collected (an update is a lock and an add).  They can be
+exported through an optional local HTTP endpoint in the Prometheus text
+format and/or a JSON stats file rewritten periodically — see
+:func:`start_exporters`.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from atomicfile import write_json_atomic
+
+log = logging.getLogger("telecopy")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, k, v) for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, k, v) for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    def time(self, **labels):
+        """Context manager observing the wall-clock duration of its block."""
+        return _Timer(self, labels)
+
+    def summaries(self):
+        """Return ``[(labels, {"count", "sum", "mean"})]`` for each label set."""
+        with self._lock:
+            return [(k, {"count": c, "sum": round(s, 6), "mean": round(s / c, 6) if c else 0.0})
+                    for k, (_, c, s) in self._values.items()]
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, sum_) in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    out.append((self.name + "_bucket", key + (("le", repr(bound)),), cumulative))
+                out.append((self.name + "_bucket", key + (("le", "+Inf"),), total))
+                out.append((self.name + "_count", key, total))
+                out.append((self.name + "_sum", key, sum_))
+        return out
+
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_t0")
+
+    def __init__(self, hist: Histogram, labels: dict):
+        self._hist, self._labels = hist, labels
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(time.perf_counter() - self._t0, **self._labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._add(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, buckets))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{_label_str(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Return ``{metric: value}`` (``{metric: {labels: value}}`` when labelled).
+
+        Histograms are summarised as count, sum and mean.
+        """
+        out: dict = {}
+        for m in self._metrics:
+            if isinstance(m, Histogram):
+                items = m.summaries()
+            else:
+                items = [(k, v) for _, k, v in m.samples()]
+            if not items:
+                continue
+            if len(items) == 1 and not items[0][0]:
+                out[m.name] = items[0][1]
+            else:
+                out[m.name] = {",".join(f"{k}={v}" for k, v in key): v for key, v in items}
+        return out
+
+
+REGISTRY = Registry()
+
+# ── TeleCopy metrics ───────────────────────────────────────────────────────────
+forward_calls = REGISTRY.counter(
+    "telecopy_forward_calls_total", "forwardMessages requests sent")
+forward_latency = REGISTRY.histogram(
+    "telecopy_forward_latency_seconds", "forwardMessages round-trip time")
+messages_copied = REGISTRY.counter(
+    "telecopy_messages_copied_total", "Messages copied to a destination")
+messages_retried = REGISTRY.counter(
+    "telecopy_messages_retried_total", "Failed messages parked for another attempt")
+messages_dead = REGISTRY.counter(
+    "telecopy_messages_dead_lettered_total", "Messages that exhausted their attempts")
+copy_jobs_failed = REGISTRY.counter(
+    "telecopy_copy_jobs_failed_total", "Copies to a destination aborted by an error")
+messages_deduplicated = REGISTRY.counter(
+    "telecopy_messages_deduplicated_total", "Messages skipped because their content was already copied")
+messages_deleted = REGISTRY.counter(
+    "telecopy_messages_deleted_total", "Messages skipped because the source chat no longer has them")
+flood_waits = REGISTRY.counter(
+    "telecopy_flood_waits_total", "FloodWait responses received")
+flood_wait_seconds = REGISTRY.counter(
+    "telecopy_flood_wait_seconds_total", "Seconds of FloodWait imposed by the server")
+send_rate = REGISTRY.gauge(
+    "telecopy_send_rate", "Current adaptive send rate (requests/s) per destination")
+history_pages = REGISTRY.counter(
+    "telecopy_history_pages_total", "getChatHistory pages fetched")
+history_latency = REGISTRY.histogram(
+    "telecopy_history_page_latency_seconds", "getChatHistory round-trip time")
+copy_map_entries = REGISTRY.gauge(
+    "telecopy_copy_map_entries", "Entries in the in-memory copy map")
+copy_map_flush = REGISTRY.histogram(
+    "telecopy_copy_map_flush_seconds", "Time to flush (and maybe compact) the copy map")
+live_updates = REGISTRY.counter(
+    "telecopy_live_updates_total", "updateNewMessage events accepted for forwarding")
+live_queue_depth = REGISTRY.gauge(
+    "telecopy_live_queue_depth", "Live messages waiting for a worker")
+live_lag = REGISTRY.gauge(
+    "telecopy_live_lag_seconds", "Age of the oldest live message not yet forwarded")
+
+
+# ── Exporters ──────────────────────────────────────────────────────────────────
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_started = False
+
+
+def start_exporters(port: int = None, stats_path: str = None, interval: float = 15.0):
+    """Start the HTTP endpoint on 127.0.0.1:*port* and/or the JSON stats writer (once)."""
+    global _started
+    if _started:
+        return
+    _started = True
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        except OSError as e:
+            log.error("Could not start metrics endpoint on port %d: %s", port, e)
+        else:
+            threading.Thread(target=server.serve_forever, name="telecopy-metrics",
+                             daemon=True).start()
+            log.info("Metrics available at http://127.0.0.1:%d/metrics", port)
+    if stats_path:
+        def write_stats():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_json_atomic(stats_path, {"ts": int(time.time()), **REGISTRY.snapshot()},
+                                      indent=1)
+                except OSError as e:
+                    log.warning("Could not write stats file %s: %s", stats_path, e)
+
+        threading.Thread(target=write_stats, name="telecopy-stats", daemon=True).start()
@@ -0,0 +1,197 @@
+"""Persistent SQLite index of source-chat message metadata (ID, date, content type, album)."""
+
+import os
+import sqlite3
+import threading
+
+from dedup import fingerprint
+
+COMMIT_EVERY = 1000  # rows written between commits (flush() commits the rest)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    id      INTEGER NOT NULL,
+    date    INTEGER NOT NULL,
+    type    TEXT    NOT NULL,
+    album   INTEGER NOT NULL DEFAULT 0,
+    fp      INTEGER,
+    PRIMARY KEY (chat_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (chat_id, date);
+CREATE TABLE IF NOT EXISTS coverage (
+    chat_id INTEGER PRIMARY KEY,
+    upto    INTEGER NOT NULL
+);
+"""
+
+
+def _row(message: dict) -> tuple:
+    return (
+        message["chat_id"], message["id"], message.get("date", 0),
+        message.get("content", {}).get("@type", ""),
+        int(message.get("media_album_id") or 0), fingerprint(message),
+    )
+
+
+class MessageIndex:
+    """Metadata of every message seen in the source chats, queryable without TDLib.
+
+    Stored per message: ID, date, content type, album and content fingerprint.
+
+    Rows come from history scans and live updates.  ``coverage(chat)`` is
+    the message ID up to which the index holds *every* message of the chat:
+    it grows only from contiguous forward history pages (and live messages
+    that directly follow it), so anything at or below it can be answered
+    locally.  Each page fetched from TDLib also replaces the rows in its ID
+    range, so messages deleted while nobody was watching drop out when that
+    range is next fetched — by a verify rescan of the full history.
+
+    Thread-safe.  The database is opened on first use (and again after
+    :meth:`close`); rows are committed in batches and on :meth:`flush`, each
+    batch together with the coverage it establishes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+        self._coverage: dict = {}
+        self._uncommitted = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            if "fp" not in {row[1] for row in db.execute("PRAGMA table_info(messages)")}:
+                # Indexes from before content fingerprints: rescan history once to fill them in.
+                db.execute("ALTER TABLE messages ADD COLUMN fp INTEGER")
+                db.execute("DELETE FROM coverage")
+                db.commit()
+            self._coverage = dict(db.execute("SELECT chat_id, upto FROM coverage"))
+            self._db = db
+        return self._db
+
+    def _written(self, rows: int):
+        self._uncommitted += rows
+        if self._uncommitted >= COMMIT_EVERY:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def _set_coverage(self, chat_id: int, upto: int):
+        self._coverage[chat_id] = upto
+        self._db.execute(
+            "INSERT OR REPLACE INTO coverage (chat_id, upto) VALUES (?, ?)", (chat_id, upto),
+        )
+
+    # ── Writing ─────────────────────────────────────────────────────────────
+
+    def add_page(self, chat_id: int, page: list, after_id: int):
+        """Store a forward history *page*: every message of *chat_id* newer than *after_id*
+        up to the page's last message, oldest first."""
+        if not page:
+            return
+        last = page[-1]["id"]
+        with self._lock:
+            self._open().execute(
+                "DELETE FROM messages WHERE chat_id = ? AND id > ? AND id <= ?",
+                (chat_id, after_id, last),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)", map(_row, page),
+            )
+            # The page continues the covered prefix only if it starts inside it.
+            upto = self._coverage.get(chat_id, 0)
+            if after_id <= upto < last:
+                self._set_coverage(chat_id, last)
+            self._written(len(page))
+
+    def add_message(self, message: dict):
+        """Store a live message, extending coverage if it directly follows it."""
+        chat_id, mid = message["chat_id"], message["id"]
+        with self._lock:
+            self._open().execute("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                             _row(message))
+            upto = self._coverage.get(chat_id, 0)
+            # Server message N has TDLib ID N << 20; N + 1 leaves no gap.
+            if upto and mid == upto + (1 << 20):
+                self._set_coverage(chat_id, mid)
+            self._written(1)
+
+    def delete(self, chat_id: int, message_ids):
+        with self._lock:
+            self._open().executemany(
+                "DELETE FROM messages WHERE chat_id = ? AND id = ?",
+                ((chat_id, mid) for mid in message_ids),
+            )
+            self._written(len(message_ids))
+
+    def flush(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+            self._uncommitted = 0
+
+    # ── Queries ─────────────────────────────────────────────────────────────
+
+    def coverage(self, chat_id: int) -> int:
+        """Return the ID up to which every message of *chat_id* is indexed (0 if none)."""
+        with self._lock:
+            self._open()
+            return self._coverage.get(chat_id, 0)
+
+    def pages(self, chat_id: int, after_id: int, upto: int, size: int = 100):
+        """Yield indexed messages of *chat_id* in ``(after_id, upto]``, oldest first, in lists.
+
+        Messages are minimal TDLib-shaped dicts: ``id``, ``chat_id``, ``date``,
+        ``media_album_id`` and ``content.@type``, plus the content ``fingerprint``.
+        """
+        while after_id < upto:
+            with self._lock:
+                rows = self._open().execute(
+                    "SELECT id, date, type, album, fp FROM messages "
+                    "WHERE chat_id = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    (chat_id, after_id, upto, size),
+                ).fetchall()
+            if not rows:
+                return
+            yield [
+                {"id": mid, "chat_id": chat_id, "date": date, "media_album_id": str(album),
+                 "content": {"@type": type_}, "fingerprint": fp}
+                for mid, date, type_, album, fp in rows
+            ]
+            after_id = rows[-1][0]
+
+    def last_before(self, chat_id: int, ts: int):
+        """Return the ID of the last message of *chat_id* dated before *ts* (0 if none).
+
+        Returns None when the covered prefix does not reach *ts*, i.e. the
+        answer might lie in history that is not indexed.
+        """
+        with self._lock:
+            db = self._open()
+            upto = self._coverage.get(chat_id, 0)
+            reaches = db.execute(
+                "SELECT 1 FROM messages WHERE chat_id = ? AND date >= ? AND id <= ? LIMIT 1",
+                (chat_id, ts, upto),
+            ).fetchone()
+            if not reaches:
+                return None
+            (mid,) = db.execute(
+                "SELECT MAX(id) FROM messages WHERE chat_id = ? AND date < ? AND id <= ?",
+                (chat_id, ts, upto),
+            ).fetchone()
+        return mid or 0
+
+    def close(self):
+        """Commit and close the database (it is reopened on next use)."""
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+            self._coverage = {}
+            self._uncommitted = 0
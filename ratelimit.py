@@ -0,0 +1,73 @@
+"""Adaptive (AIMD) request pacing that learns from Telegram FloodWait responses."""
+
+import threading
+import time
+
+INITIAL_RATE = 1.0      # requests per second before anything has been learned
+MIN_RATE = 0.05         # never slow down below one request per 20 s
+MAX_RATE = 10.0         # never probe above this
+BURST = 3               # requests allowed back-to-back after an idle period
+INCREASE_STEP = 0.1     # additive increase (req/s) after a clean streak
+INCREASE_AFTER = 20     # consecutive successes that make a streak "clean"
+DECREASE_FACTOR = 0.5   # multiplicative decrease on every FloodWait
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token-bucket pacer with additive-increase / multiplicative-decrease.
+
+    :meth:`reserve` hands out send slots spaced ``1 / rate`` seconds apart
+    (with up to ``BURST`` slots of idle credit), so every thread sharing a
+    limiter is paced together.  A FloodWait halves the rate and holds all
+    callers until the server's wait has elapsed; every ``INCREASE_AFTER``
+    clean successes nudge the rate back up by ``INCREASE_STEP``, so it
+    settles just under the point where Telegram starts throttling.
+    """
+
+    def __init__(self, rate: float = INITIAL_RATE):
+        self._lock = threading.Lock()
+        self.rate = min(MAX_RATE, max(MIN_RATE, rate))
+        self._next = 0.0           # earliest monotonic time of the next free slot
+        self._blocked_until = 0.0  # FloodWait hold shared by all callers
+        self._streak = 0
+
+    def reserve(self) -> float:
+        """Claim the next send slot and return how many seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self.rate
+            slot = max(self._next, now - (BURST - 1) * interval, self._blocked_until)
+            self._next = slot + interval
+            return max(0.0, slot - now)
+
+    def acquire(self):
+        """Block until the caller may send its next request."""
+        delay = self.reserve()
+        while delay > 0:
+            time.sleep(delay)
+            # A FloodWait may have arrived while this slot was pending.
+            delay = self.reserve() if self.held() else 0
+
+    def held(self) -> bool:
+        """Whether a FloodWait hold is currently in force."""
+        with self._lock:
+            return time.monotonic() < self._blocked_until
+
+    def on_success(self):
+        with self._lock:
+            self._streak += 1
+            if self._streak >= INCREASE_AFTER:
+                self._streak = 0
+                self.rate = min(MAX_RATE, self.rate + INCREASE_STEP)
+
+    def on_flood(self, wait: float):
+        """Record a FloodWait of *wait* seconds: back off and hold every caller."""
+        with self._lock:
+            self._streak = 0
+            now = time.monotonic()
+            # Requests already in flight when the first FloodWait arrived will
+            # hit it too — slow down once per hold, not once per request.
+            if now >= self._blocked_until:
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            until = now + wait
+            self._blocked_until = max(self._blocked_until, until)
+            self._next = max(self._next, until)
@@ -0,0 +1,133 @@
+"""Non-blocking retry scheduling and a persistent dead-letter queue for failed copies."""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import metrics
+from atomicfile import write_atomic
+
+log = logging.getLogger("telecopy")
+
+
+class RetryScheduler:
+    """Time-ordered heap of failed items waiting for their next attempt.
+
+    Instead of sleeping through exponential back-off, a copy loop parks a
+    failed item here and carries on with the rest of its work, picking the
+    item up again via :meth:`pop_due` once ``base_delay ** attempt`` seconds
+    have passed.  After *max_attempts* failures :meth:`park` returns False
+    and the caller dead-letters the item.  Not thread-safe: each copy loop or
+    live worker owns its own scheduler.
+    """
+
+    def __init__(self, max_attempts: int, base_delay: float = 2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._heap: list = []
+        self._attempts: dict = {}
+        self._seq = itertools.count()  # tie-breaker so items are never compared
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def park(self, key, item, error) -> bool:
+        """Schedule *item* for another attempt; False once its attempts are used up."""
+        attempt = self._attempts.get(key, 0) + 1
+        if attempt >= self.max_attempts:
+            self._attempts.pop(key, None)
+            return False
+        self._attempts[key] = attempt
+        delay = self.base_delay ** attempt
+        log.warning(
+            "Attempt %d/%d for %s failed: %s (retrying in %ds)",
+            attempt, self.max_attempts, key, error, delay,
+        )
+        metrics.messages_retried.inc()
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), item))
+        return True
+
+    def done(self, key):
+        """Forget the attempt count of *key* after it finally succeeded."""
+        self._attempts.pop(key, None)
+
+    def pop_due(self) -> list:
+        """Remove and return every item whose retry time has come, oldest first."""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def drain(self) -> list:
+        """Remove and return every parked item, due or not, oldest first."""
+        items = [entry[2] for entry in sorted(self._heap)]
+        self._heap.clear()
+        self._attempts.clear()
+        return items
+
+    def next_due_in(self):
+        """Seconds until the next parked item is due (0 if overdue), or None if empty."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+class DeadLetterQueue:
+    """Append-only JSONL file of messages that exhausted their copy attempts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def add(self, src: int, dst: int, msg_id: int, error):
+        entry = {"src": src, "dst": dst, "id": msg_id, "error": str(error), "ts": int(time.time())}
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        metrics.messages_dead.inc()
+        log.error("Message %d dead-lettered after repeated failures: %s", msg_id, error)
+
+    def _read(self) -> list:
+        entries = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def load(self) -> list:
+        with self._lock:
+            return self._read()
+
+    def remove(self, entries: list):
+        """Drop *entries* (as returned by :meth:`load`) from the queue, keeping any added since."""
+        # Counted, and matched from the start of the file, so an identical
+        # entry appended later (the same failure again) is kept.
+        done = Counter(json.dumps(e, sort_keys=True) for e in entries)
+        with self._lock:
+            keep = []
+            for e in self._read():
+                key = json.dumps(e, sort_keys=True)
+                if done[key]:
+                    done[key] -= 1
+                else:
+                    keep.append(e)
+            if not keep:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                return
+            write_atomic(self.path, (json.dumps(e) + "\n" for e in keep))
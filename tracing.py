@@ -0,0 +1,268 @@
+"""Opt-in per-stage trace spans and whole-run profiling for TeleCopy.
+
+With tracing enabled (``TRACE_FILE`` in .env), the copy pipeline wraps each
+stage — history page fetch, forwardMessages round trip, rate-limit pacing,
+FloodWait hold, retry back-off and copy-map flush — in a timed span and
+appends one JSON line per span to the trace file::
+
+    {"span": "forward", "start": 1700000000.123, "dur": 0.231,
+     "thread": "MainThread", "chat": -1002, "ids": [1048576, 2097152]}
+
+When tracing is off, :func:`span` returns a shared no-op context manager, so
+the instrumented code costs one function call per stage.
+
+Summarise a trace with::
+
+    python -m tracing data/trace.jsonl [--top 10]
+
+``PROFILE=cprofile`` or ``PROFILE=sample`` additionally profiles the whole
+run — see :func:`start_profiler`.
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+log = logging.getLogger("telecopy")
+
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples in PROFILE=sample mode
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_attrs", "_start", "_t0")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self._tracer, self._name, self._attrs = tracer, name, attrs
+
+    def set(self, **attrs):
+        """Attach more attributes (e.g. a result size) before the span closes."""
+        self._attrs.update(attrs)
+
+    def __enter__(self):
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self._t0
+        record = {"span": self._name, "start": round(self._start, 6), "dur": round(dur, 6),
+                  "thread": threading.current_thread().name}
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        record.update(self._attrs)
+        self._tracer.write(record)
+        return False
+
+
+class Tracer:
+    """Thread-safe appender of span records to a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1 << 16)
+
+    def write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer = None
+
+
+def enable(path: str):
+    """Start appending spans to *path* (flushed and closed at exit)."""
+    global _tracer
+    if _tracer is not None:
+        return
+    _tracer = Tracer(path)
+    atexit.register(_tracer.close)
+    log.info("Tracing copy stages to %s", path)
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attrs):
+    """Return a context manager recording how long its block takes as span *name*."""
+    if _tracer is None:
+        return _NO_SPAN
+    return _Span(_tracer, name, attrs)
+
+
+# ── Whole-run profiling ────────────────────────────────────────────────────────
+
+class _Sampler:
+    """Sample every thread's stack each *interval* seconds into folded-stack counts."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telecopy-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = ";".join(
+                    f"{os.path.basename(f.filename)}:{f.name}"
+                    for f in traceback.extract_stack(frame)
+                )
+                self.stacks[f"{names.get(ident, ident)};{stack}"] += 1
+
+    def stop(self, path: str):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def start_profiler(mode: str, path: str = None):
+    """Profile the rest of the run, writing the result to *path* at exit.
+
+    ``cprofile`` profiles the calling thread deterministically and writes a
+    ``pstats`` file (inspect with ``python -m pstats``).  ``sample`` samples
+    every thread's stack and writes folded stacks that flamegraph.pl or
+    speedscope can render.
+    """
+    mode = mode.lower()
+    if mode == "cprofile":
+        import cProfile
+        path = path or "data/profile.pstats"
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def finish():
+            profiler.disable()
+            profiler.dump_stats(path)
+            log.info("cProfile data written to %s", path)
+    elif mode == "sample":
+        path = path or "data/profile.folded"
+        sampler = _Sampler()
+        sampler.start()
+
+        def finish():
+            sampler.stop(path)
+            log.info("Stack samples written to %s", path)
+    else:
+        log.warning("Unknown PROFILE mode '%s' — expected 'cprofile' or 'sample'.", mode)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    atexit.register(finish)
+    log.info("Profiling (%s) enabled.", mode)
+
+
+# ── Trace summary ──────────────────────────────────────────────────────────────
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(path: str, top: int = 10, out=sys.stdout):
+    """Print a per-stage latency breakdown and the slowest spans and messages in *path*."""
+    durations: dict[str, list] = {}
+    slowest: list = []
+    per_message: Counter = Counter()
+    first = last = None
+    with open(path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash
+            durations.setdefault(rec["span"], []).append(rec["dur"])
+            slowest.append(rec)
+            first = rec["start"] if first is None else min(first, rec["start"])
+            last = max(last or 0, rec["start"] + rec["dur"])
+            ids = rec.get("ids")
+            if rec["span"] == "forward" and ids:
+                # A batch's round trip is shared by every message in it.
+                for mid in ids:
+                    per_message[mid] += rec["dur"] / len(ids)
+    if not durations:
+        print(f"No spans in {path}.", file=out)
+        return
+
+    wall = (last - first) if first is not None else 0.0
+    print(f"{path}: {sum(map(len, durations.values()))} spans over {wall:.1f}s wall clock\n",
+          file=out)
+    print(f"{'stage':<16}{'count':>8}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}"
+          f"{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=out)
+    for name, values in sorted(durations.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        total = sum(values)
+        print(f"{name:<16}{len(values):>8}{total:>10.2f}{total / len(values) * 1e3:>10.1f}"
+              f"{_percentile(values, 0.5) * 1e3:>10.1f}{_percentile(values, 0.95) * 1e3:>10.1f}"
+              f"{_percentile(values, 0.99) * 1e3:>10.1f}{values[-1] * 1e3:>10.1f}", file=out)
+
+    print(f"\nSlowest {top} spans:", file=out)
+    for rec in sorted(slowest, key=lambda r: -r["dur"])[:top]:
+        attrs = {k: v for k, v in rec.items() if k not in ("span", "start", "dur", "ids")}
+        if "ids" in rec:
+            attrs["messages"] = len(rec["ids"])
+        print(f"  {rec['dur'] * 1e3:>10.1f} ms  {rec['span']:<14} {attrs}", file=out)
+
+    if per_message:
+        print(f"\nMessages with the most forwarding time ({top}):", file=out)
+        for mid, total in per_message.most_common(top):
+            print(f"  {mid:>20}  {total * 1e3:>10.1f} ms", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a TeleCopy trace file.")
+    parser.add_argument("path", nargs="?", default="data/trace.jsonl")
+    parser.add_argument("--top", type=int, default=10, help="offenders to list (default: 10)")
+    args = parser.parse_args(argv)
+    try:
+        summarize(args.path, args.top)
+    except FileNotFoundError:
+        parser.error(f"no trace file at {args.path}")
+
+
+if __name__ == "__main__":
+    main()